@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Customer, Order
+from .models import Customer, Order, SMSNotification
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -8,3 +8,9 @@ class CustomerAdmin(admin.ModelAdmin):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'item', 'amount', 'time')
+    list_select_related = ('customer',)
+
+@admin.register(SMSNotification)
+class SMSNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to_number', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
@@ -0,0 +1,177 @@
+"""
+Async client for the Africa's Talking SMS gateway.
+
+The ``africastalking`` SDK blocks a thread for each gateway round trip. Under
+ASGI these coroutines talk to the messaging API directly over one pooled
+``httpx.AsyncClient`` per event loop, with a semaphore bounding how many
+requests are in flight at once (``SMS_ASYNC_MAX_CONCURRENCY``).
+
+Pooling and the concurrency bound need a long-lived loop: the ASGI server's,
+or the one ``dispatch_sms --async`` runs. Under WSGI, Django runs each async
+view on a new loop in ``async_to_sync``. ``closes_loop_client`` then closes
+that request's client when the view returns, so the views still work there,
+but each request opens its own connection.
+
+Results have the same shape as ``core.utils.send_bulk_sms``.
+"""
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from .metrics import timed
+from .phones import to_e164
+from .utils import _recipient_result, recipient_results
+
+logger = logging.getLogger(__name__)
+
+# httpx clients and asyncio primitives are bound to the loop that created them
+_clients = weakref.WeakKeyDictionary()
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def gateway_configured() -> bool:
+    return bool(settings.AFRICASTALKING_USERNAME and settings.AFRICASTALKING_API_KEY)
+
+
+def get_client():
+    """Shared ``httpx.AsyncClient`` (and connection pool) for the running event loop."""
+    # Imported here: httpx is only needed by async senders, not every process
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.SMS_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SMS_ASYNC_MAX_CONNECTIONS,
+            ),
+            timeout=settings.SMS_ASYNC_TIMEOUT,
+            headers={"Accept": "application/json"},
+        )
+    return client
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.SMS_ASYNC_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def aclose():
+    """Close the running loop's client; call before the loop shuts down."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def closes_loop_client(view):
+    """
+    Decorate async views that send through this module. Outside ASGI the
+    request's event loop is about to end, so its client is closed rather
+    than left holding sockets.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            if not isinstance(request, ASGIRequest):
+                await aclose()
+    return wrapper
+
+
+async def _post(message: str, numbers):
+    async with _semaphore():
+        response = await get_client().post(
+            settings.SMS_GATEWAY_URL,
+            data={
+                "username": settings.AFRICASTALKING_USERNAME,
+                "to": ",".join(numbers),
+                "message": message,
+            },
+            headers={"apiKey": settings.AFRICASTALKING_API_KEY},
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+@timed("sms")
+async def asend_sms(to_number: str, message: str, fail_silently: bool = True):
+    """Async ``send_sms``: returns the gateway response or a simulated one."""
+    to_number = to_e164(to_number)
+    if not gateway_configured():
+        logger.info("Simulating SMS send to %s: %s", to_number, message)
+        return {"status": "simulated", "to": to_number, "message": message}
+
+    try:
+        response = await _post(message, [to_number])
+        logger.info("SMS sent: %s", response)
+        return response
+    except Exception as e:
+        if not fail_silently:
+            raise
+        logger.warning("Failed to send SMS, returning simulated response. Error: %s", e)
+        return {"status": "simulated", "to": to_number, "message": message}
+
+
+@timed("sms")
+async def asend_bulk_sms(message: str, recipients, fail_silently: bool = True):
+    """Async ``send_bulk_sms``: one gateway call, one result per recipient."""
+    numbers = list(OrderedDict.fromkeys(to_e164(n) for n in recipients))
+    if not gateway_configured():
+        logger.info("Simulating bulk SMS send to %s recipient(s): %s", len(numbers), message)
+        return [_recipient_result(n, "simulated", True) for n in numbers]
+
+    try:
+        response = await _post(message, numbers)
+        logger.info("Bulk SMS sent to %s recipient(s)", len(numbers))
+    except Exception as e:
+        if not fail_silently:
+            raise
+        logger.warning("Failed to send bulk SMS, returning simulated response. Error: %s", e)
+        return [_recipient_result(n, "simulated", True) for n in numbers]
+    return recipient_results(numbers, response)
+
+
+async def asend_many(messages, max_batch_size: int = None):
+    """
+    Send ``(to_number, message)`` pairs concurrently.
+
+    Like ``SMSBatcher``, identical texts share multi-recipient calls of at
+    most ``max_batch_size`` numbers; the calls then run concurrently, bounded
+    by ``SMS_ASYNC_MAX_CONCURRENCY``. A failed call yields ``"error"``
+    results for its recipients instead of raising. Every result carries the
+    ``message`` it was sent with.
+    """
+    max_batch_size = max_batch_size or settings.SMS_BATCH_MAX_SIZE
+    groups = OrderedDict()
+    for to_number, message in messages:
+        groups.setdefault(message, []).append(to_number)
+
+    calls = [
+        (message, numbers[i:i + max_batch_size])
+        for message, numbers in groups.items()
+        for i in range(0, len(numbers), max_batch_size)
+    ]
+    sent = await asyncio.gather(*(asend_bulk_sms(m, n, fail_silently=False) for m, n in calls), return_exceptions=True)
+
+    results = []
+    for (message, numbers), outcome in zip(calls, sent):
+        if isinstance(outcome, BaseException):
+            logger.warning("Bulk SMS to %s recipient(s) failed: %s", len(numbers), outcome)
+            outcome = [
+                dict(_recipient_result(to_e164(n), "error", False), error=str(outcome) or type(outcome).__name__)
+                for n in OrderedDict.fromkeys(numbers)
+            ]
+        for result in outcome:
+            result["message"] = message
+        results.extend(outcome)
+    return results
@@ -1,11 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import authentication, exceptions
-from decouple import config
+from google.auth import transport
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 
+from .metrics import timed
+
+
+def _max_age(headers):
+    """Return the Cache-Control max-age of a response in seconds, or 0."""
+    cache_control = next((v for k, v in headers.items() if k.lower() == "cache-control"), "")
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age":
+            try:
+                return max(int(value), 0)
+            except ValueError:
+                return 0
+    return 0
+
+
+class CachingCertsRequest(transport.Request):
+    """
+    google.auth transport that keeps one pooled HTTP session and caches
+    successful GET responses (Google's signing certs) for their max-age.
+    """
+
+    def __init__(self, request=None):
+        self._request = request or google_requests.Request(session=requests.Session())
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET":
+            return self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+        cached = self._cache.get(url)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            response = self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+            max_age = _max_age(response.headers) if response.status == 200 else 0
+            if max_age:
+                self._cache[url] = (time.monotonic() + max_age, response)
+            return response
+
+    def clear(self):
+        self._cache.clear()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token digests -> (exp, user id), valid until exp."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, token, exp, user_id):
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, user_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, token):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+certs_request = CachingCertsRequest()
+token_cache = VerifiedTokenCache(settings.GOOGLE_OIDC_TOKEN_CACHE_SIZE)
+
+
 class GoogleOIDCAuthentication(authentication.BaseAuthentication):
-    """Validate Google ID Token from Authorization: Bearer <token>"""
+    """
+    Validate Google ID Token from Authorization: Bearer <token>
+
+    Signing certs are cached for their Cache-Control max-age and verified
+    tokens are remembered (as the user id) until they expire. A repeat token
+    is resolved without network calls or database writes, with one query
+    that loads the user, so deactivated or edited users take effect at once.
+    """
 
     def authenticate(self, request):
         auth_header = authentication.get_authorization_header(request).decode("utf-8")
@@ -17,12 +125,21 @@ class GoogleOIDCAuthentication(authentication.BaseAuthentication):
             return None
 
         token = parts[1]
-        client_id = config("GOOGLE_OIDC_CLIENT_ID", default=None)
+        user_id = token_cache.get(token)
+        if user_id is not None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None or not user.is_active:
+                token_cache.delete(token)
+                raise exceptions.AuthenticationFailed("User inactive or deleted.")
+            return (user, None)
+
+        client_id = settings.GOOGLE_OIDC_CLIENT_ID
         if not client_id:
             raise exceptions.AuthenticationFailed("Google OIDC client ID not configured")
 
         try:
-            idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), client_id)
+            with timed("oidc"):
+                idinfo = id_token.verify_oauth2_token(token, certs_request, client_id)
         except ValueError:
             raise exceptions.AuthenticationFailed("Invalid Google ID token")
 
@@ -38,4 +155,8 @@ class GoogleOIDCAuthentication(authentication.BaseAuthentication):
                 "last_name": idinfo.get("family_name", ""),
             },
         )
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        if "exp" in idinfo:
+            token_cache.set(token, idinfo["exp"], user.pk)
         return (user, None)
@@ -0,0 +1 @@
+"""Benchmark helpers for the Savannah API (load generation and reporting)."""
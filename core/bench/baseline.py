@@ -0,0 +1,36 @@
+"""Compare benchmark results against a committed baseline."""
+import json
+
+# Latency and allocations vary between runs and machines; query counts must not grow at all
+DEFAULT_TOLERANCE = 1.0
+# Median latency is compared; tail percentiles are too noisy for a pass/fail gate
+LATENCY_METRIC = "p50_ms"
+
+
+def load(path):
+    with open(path) as fh:
+        return {r["name"]: r for r in json.load(fh)["results"]}
+
+
+def save(path, results, meta=None):
+    with open(path, "w") as fh:
+        json.dump({"meta": meta or {}, "results": results}, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return a list of human-readable regressions (empty when everything is within bounds)."""
+    regressions = []
+    for result in results:
+        base = baseline.get(result["name"])
+        if base is None:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(f"{result['name']}: queries/request {base['queries']} -> {result['queries']}")
+        for metric in (LATENCY_METRIC, "alloc_kib"):
+            limit = base[metric] * (1 + tolerance)
+            if base[metric] and result[metric] > limit:
+                regressions.append(
+                    f"{result['name']}: {metric} {base[metric]} -> {result[metric]} (limit {limit:.1f})"
+                )
+    return regressions
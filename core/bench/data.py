@@ -0,0 +1,55 @@
+"""Deterministic data generator for benchmarks."""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core import rollups
+from core.models import Customer, Order
+
+ITEMS = ["Maize flour", "Sugar", "Cooking oil", "Rice", "Tea leaves", "Milk", "Soap", "Bread"]
+
+
+def seed(customers=100, orders=1000, batch_size=1000, random_seed=0):
+    """
+    Insert ``customers`` customers and ``orders`` orders spread over the last
+    90 days. Returns the list of customer ids.
+    """
+    rng = random.Random(random_seed)
+    start = Customer.objects.count()
+    created = Customer.objects.bulk_create(
+        [
+            Customer(
+                name=f"Bench Customer {start + i}",
+                code=f"BENCH{start + i:07d}",
+                phone_number=f"+2547{rng.randrange(10 ** 8):08d}",
+            )
+            for i in range(customers)
+        ],
+        batch_size=batch_size,
+    )
+    customer_ids = [c.pk for c in created]
+
+    now = timezone.now()
+    batch = []
+    for _ in range(orders):
+        batch.append(Order(
+            customer_id=rng.choice(customer_ids),
+            item=rng.choice(ITEMS),
+            amount=Decimal(rng.randrange(100, 1000000)) / 100,
+        ))
+        if len(batch) >= batch_size:
+            _insert_orders(batch, now, rng)
+            batch = []
+    _insert_orders(batch, now, rng)
+    return customer_ids
+
+
+def _insert_orders(batch, now, rng):
+    Order.objects.bulk_create(batch)
+    # auto_now_add stamps "now"; spread the orders out afterwards
+    for order in batch:
+        order.time = now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+    Order.objects.bulk_update(batch, ["time"])
+    rollups.record_orders(batch)
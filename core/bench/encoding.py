@@ -0,0 +1,110 @@
+"""
+Response encoding cost per format, without a database or HTTP in the way.
+
+Unsaved orders and customers are serialized once with ``OrderSerializer`` and
+``CustomerSerializer`` (as the list endpoints return them). Each renderer then
+encodes that payload ``repeat`` times. We report the size of the body raw and
+gzipped, and the process CPU time to encode ``PER_ROWS`` rows.
+"""
+import gzip
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.bench.data import ITEMS
+from core.models import Customer, Order
+from core.serializers import CustomerSerializer, OrderSerializer
+
+PER_ROWS = 10000
+
+
+def build_payloads(rows, random_seed=0):
+    """``{"order": [...], "customer": [...]}`` serializer output for ``rows`` unsaved objects each."""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    customers = [
+        Customer(
+            id=i + 1,
+            name=f"Bench Customer {i}",
+            code=f"BENCH{i:07d}",
+            phone_number=f"+2547{rng.randrange(10 ** 8):08d}",
+        )
+        for i in range(rows)
+    ]
+    orders = [
+        Order(
+            id=i + 1,
+            customer_id=rng.randrange(1, rows + 1),
+            item=rng.choice(ITEMS),
+            amount=Decimal(rng.randrange(100, 1000000)) / 100,
+            time=now - timedelta(seconds=rng.randrange(90 * 24 * 3600)),
+        )
+        for i in range(rows)
+    ]
+    return {
+        "order": OrderSerializer(orders, many=True).data,
+        "customer": CustomerSerializer(customers, many=True).data,
+    }
+
+
+def available_renderers():
+    """``(name, renderer, context)`` for the formats installed here; DRF's JSONRenderer first."""
+    from core.views import OrderViewSet
+
+    candidates = [
+        ("json", JSONRenderer(), {}),
+        ("orjson", renderers.FastJSONRenderer(), {}),
+    ]
+    if renderers.msgpack is not None:
+        candidates.append(("msgpack", renderers.MessagePackRenderer(), {}))
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        candidates.append(("arrow", renderers.ArrowRenderer(), {"order": {"view": OrderViewSet()}}))
+    return candidates
+
+
+def measure(payload, renderer, context=None, repeat=5):
+    """Body size, gzipped size and median/min CPU seconds of ``repeat`` renders."""
+    cpu = []
+    for _ in range(repeat):
+        start = time.process_time()
+        body = renderer.render(payload, renderer.media_type, context or {})
+        cpu.append(time.process_time() - start)
+    return {
+        "bytes": len(body),
+        "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+        "cpu_median_s": statistics.median(cpu),
+        "cpu_min_s": min(cpu),
+    }
+
+
+def run(rows=PER_ROWS, repeat=5, only=None):
+    """One result per (serializer, format), scaled to ``PER_ROWS`` rows."""
+    payloads = build_payloads(rows)
+    scale = PER_ROWS / rows
+    results = []
+    for name, renderer, contexts in available_renderers():
+        if only and name not in only:
+            continue
+        for kind, payload in payloads.items():
+            r = measure(payload, renderer, contexts.get(kind), repeat=repeat)
+            results.append({
+                "serializer": kind,
+                "format": name,
+                "media_type": renderer.media_type,
+                "rows": rows,
+                "bytes_per_10k": round(r["bytes"] * scale),
+                "gzip_bytes_per_10k": round(r["gzip_bytes"] * scale),
+                "cpu_ms_per_10k": round(r["cpu_median_s"] * scale * 1000, 2),
+                "cpu_min_ms_per_10k": round(r["cpu_min_s"] * scale * 1000, 2),
+            })
+    return results
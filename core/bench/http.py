@@ -0,0 +1,97 @@
+"""
+Minimal HTTP load generator (stdlib only).
+
+Each worker thread keeps one persistent ``http.client`` connection and
+issues requests back to back, so the numbers reflect server throughput
+rather than client connection setup.
+"""
+import base64
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    index = max(int(round(pct / 100 * len(samples))) - 1, 0)
+    return samples[min(index, len(samples) - 1)]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99/max in milliseconds for a list of durations in seconds."""
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round((ordered[-1] if ordered else 0) * 1000, 3),
+    }
+
+
+def run_load(url, total_requests=1000, concurrency=10, method="GET", body=None, headers=None, auth=None):
+    """
+    Send ``total_requests`` requests to ``url`` from ``concurrency`` threads.
+    Returns requests/second, latency percentiles and the status code counts.
+    """
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = dict(headers or {})
+    if auth:
+        token = base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode()
+        headers["Authorization"] = f"Basic {token}"
+    if body is not None and isinstance(body, str):
+        body = body.encode()
+
+    remaining = [total_requests]
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def worker():
+        conn = connection_class(parts.netloc, timeout=30)
+        local_latencies, local_statuses = [], {}
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                code = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = connection_class(parts.netloc, timeout=30)
+                code = "error"
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[code] = local_statuses.get(code, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for code, count in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "method": method,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "statuses": statuses,
+        **latency_summary(latencies),
+    }
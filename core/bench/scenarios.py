@@ -0,0 +1,140 @@
+"""
+In-process API benchmarks driven through the DRF test client.
+
+Each scenario is timed for latency, then re-run with a query counter and
+under tracemalloc to measure queries and allocated memory per request
+without skewing the timings. Garbage is collected around the tracemalloc
+run, so the memory figure is what requests leave behind (caches, pools)
+rather than whatever the collector had not reached yet.
+"""
+import gc
+import itertools
+import json
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .http import latency_summary
+
+
+class Scenario:
+    def __init__(self, name, method, url, body=None, client="forced", settings=None):
+        self.name = name
+        self.method = method
+        # url / body may be callables taking the iteration number
+        self.url = url
+        self.body = body
+        self.client = client
+        self.settings = settings or {}
+
+    def request(self, client, i):
+        url = self.url(i) if callable(self.url) else self.url
+        body = self.body(i) if callable(self.body) else self.body
+        if self.method == "GET":
+            return client.get(url)
+        return client.post(url, data=json.dumps(body), content_type="application/json")
+
+
+# List scenarios measure the query path; *_cached ones measure cached responses
+UNCACHED = {"LIST_CACHE_TIMEOUT": 0}
+# The bench creates orders far faster than the per-user/per-phone rates allow
+UNTHROTTLED = {"THROTTLE_ENABLED": False}
+
+
+def default_scenarios(customer_ids, order_ids):
+    customers = itertools.cycle(customer_ids)
+    orders = itertools.cycle(order_ids)
+    return [
+        Scenario("customer_list", "GET", reverse("customer-list"), settings=UNCACHED),
+        Scenario("customer_retrieve", "GET", lambda i: reverse("customer-detail", args=[next(customers)])),
+        Scenario("customer_stats", "GET", lambda i: reverse("customer-stats", args=[next(customers)])),
+        Scenario("order_list", "GET", reverse("order-list"), settings=UNCACHED),
+        Scenario("order_list_cached", "GET", reverse("order-list")),
+        Scenario("order_list_expand", "GET", reverse("order-list") + "?expand=customer", settings=UNCACHED),
+        Scenario("order_retrieve", "GET", lambda i: reverse("order-detail", args=[next(orders)])),
+        Scenario(
+            "order_create", "POST", reverse("order-list"),
+            body=lambda i: {"customer": next(customers), "item": f"Bench {i}", "amount": "99.50"},
+            settings=UNTHROTTLED,
+        ),
+        Scenario(
+            "order_bulk_100", "POST", reverse("order-bulk"),
+            body=lambda i: [
+                {"customer": next(customers), "item": f"Bulk {i}-{j}", "amount": "12.00"} for j in range(100)
+            ],
+            settings=UNTHROTTLED,
+        ),
+        Scenario("session_auth_customer_list", "GET", reverse("customer-list"), client="session", settings=UNCACHED),
+    ]
+
+
+def make_clients(user, password):
+    forced = APIClient()
+    forced.force_authenticate(user=user)
+    session = APIClient()
+    session.login(username=user.username, password=password)
+    return {"forced": forced, "session": session}
+
+
+def run_scenario(scenario, client, iterations=50, warmup=5, profile_iterations=5):
+    with override_settings(**scenario.settings):
+        return _run_scenario(scenario, client, iterations, warmup, profile_iterations)
+
+
+def _run_scenario(scenario, client, iterations, warmup, profile_iterations):
+    for i in range(warmup):
+        scenario.request(client, i)
+
+    latencies = []
+    statuses = set()
+    for i in range(iterations):
+        start = time.perf_counter()
+        response = scenario.request(client, i)
+        latencies.append(time.perf_counter() - start)
+        statuses.add(response.status_code)
+
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        for i in range(profile_iterations):
+            scenario.request(client, i)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for i in range(profile_iterations):
+            scenario.request(client, i)
+        gc.collect()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated = sum(stat.size for stat in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        "name": scenario.name,
+        "iterations": iterations,
+        "rps": round(iterations / total, 1) if total else 0.0,
+        **latency_summary(latencies),
+        "queries": round(len(queries) / profile_iterations, 2),
+        "alloc_kib": round(allocated / profile_iterations / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "statuses": sorted(statuses),
+    }
+
+
+def run_all(scenarios, clients, iterations=50, only=None):
+    results = []
+    for scenario in scenarios:
+        if only and scenario.name not in only:
+            continue
+        results.append(run_scenario(scenario, clients[scenario.client], iterations=iterations))
+    return results
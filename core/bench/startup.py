@@ -0,0 +1,68 @@
+"""
+Cold-start measurements for the settings profiles (``SAVANNAH_PROFILE``).
+
+Each run is a fresh interpreter, as in a newly scheduled container:
+``manage.py check`` is timed wall-clock, and one extra run under
+``python -X importtime`` is parsed to show where import time goes.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """``(self_us, cumulative_us, module)`` for every line of ``-X importtime`` output."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return entries
+
+
+def package_totals(entries):
+    """Self import time per top-level package, in microseconds."""
+    totals = Counter()
+    for self_us, _, module in entries:
+        totals[module.partition(".")[0]] += self_us
+    return totals
+
+
+def _run(args, profile):
+    env = {**os.environ, "SAVANNAH_PROFILE": profile, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *args],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed under profile {profile!r}:\n{completed.stderr[-2000:]}")
+    return elapsed, completed.stderr
+
+
+def measure_profile(profile, repeat=5, top=10):
+    """Median/min ``manage.py check`` time, total import time and the heaviest packages."""
+    manage = str(settings.BASE_DIR / "manage.py")
+    timings = [_run([manage, "check"], profile)[0] for _ in range(repeat)]
+    _, stderr = _run(["-X", "importtime", manage, "check"], profile)
+    entries = parse_importtime(stderr)
+    return {
+        "profile": profile,
+        "check_median_s": round(statistics.median(timings), 3),
+        "check_min_s": round(min(timings), 3),
+        "modules": len(entries),
+        "import_ms": round(sum(e[0] for e in entries) / 1000, 1),
+        "top_packages": [(name, round(us / 1000, 1)) for name, us in package_totals(entries).most_common(top)],
+    }
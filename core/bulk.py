@@ -0,0 +1,108 @@
+"""
+Bulk ingestion helpers used by the ``bulk`` endpoints.
+
+Rows are validated with the regular serializer rules, related objects are
+resolved with a single query and valid rows are written with ``bulk_create``,
+or with COPY on PostgreSQL when the psycopg 3 driver is in use.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import changes, rollups
+from .cache import bump_table_version
+from .models import ChangeLogEntry, Customer, Order, SMSNotification
+from .outbox import order_message
+from .phones import to_e164
+from .serializers import OrderBulkSerializer
+
+
+def create_orders(rows):
+    """
+    Validate and insert a list of order dicts.
+
+    Each row gives its customer as ``customer`` (id) or ``customer_code``.
+    Returns one result per input row, in order: ``{"index", "id"}`` for
+    created orders and ``{"index", "errors"}`` for rejected ones.
+    """
+    row_serializer = OrderBulkSerializer()
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, row_serializer.run_validation(row)))
+        except serializers.ValidationError as exc:
+            results[index] = {"index": index, "errors": exc.detail}
+
+    ids = {attrs["customer"] for _, attrs in valid if "customer" in attrs}
+    codes = {attrs["customer_code"] for _, attrs in valid if "customer" not in attrs}
+    by_id, by_code = {}, {}
+    for customer in Customer.objects.filter(Q(id__in=ids) | Q(code__in=codes)).only("id", "code", "name", "phone_number"):
+        by_id[customer.id] = by_code[customer.code] = customer
+
+    pending = []
+    for index, attrs in valid:
+        if "customer" in attrs:
+            customer = by_id.get(attrs["customer"])
+            missing = {"customer": [f'Invalid pk "{attrs["customer"]}" - object does not exist.']}
+        else:
+            customer = by_code.get(attrs["customer_code"])
+            missing = {"customer_code": [f'No customer with code "{attrs["customer_code"]}".']}
+        if customer is None:
+            results[index] = {"index": index, "errors": missing}
+            continue
+        pending.append((index, customer, Order(customer=customer, item=attrs["item"], amount=attrs["amount"])))
+
+    batch_size = settings.ORDERS_BULK_BATCH_SIZE
+    orders = [order for _, _, order in pending]
+    with transaction.atomic():
+        if orders and _can_copy():
+            _copy_orders(orders)
+        else:
+            Order.objects.bulk_create(orders, batch_size=batch_size)
+        # bulk_create and COPY skip the post_save signals, so fold rollups and the change log in here
+        rollups.record_orders(orders)
+        changes.record_changes((order, ChangeLogEntry.OP_INSERT) for order in orders)
+        if orders:
+            transaction.on_commit(lambda: bump_table_version("order"))
+        SMSNotification.objects.bulk_create(
+            [
+                SMSNotification(order=order, to_number=to_e164(customer.phone_number), message=order_message(customer, order))
+                for _, customer, order in pending
+                if customer.phone_number
+            ],
+            batch_size=batch_size,
+        )
+
+    for index, _, order in pending:
+        results[index] = {"index": index, "id": order.pk}
+    return results
+
+
+def _can_copy():
+    if not settings.ORDERS_BULK_USE_COPY or connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        return hasattr(cursor.cursor, "copy")
+
+
+def _copy_orders(orders):
+    """
+    Insert orders with COPY FROM STDIN. Primary keys are reserved up front
+    from the table's sequence so callers still get ids back. Each row is
+    stamped with its own time, as ``auto_now_add`` does under ``bulk_create``.
+    """
+    table = Order._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [table, len(orders)],
+        )
+        for order, (pk,) in zip(orders, cursor.fetchall()):
+            order.pk = pk
+            order.time = timezone.now()
+        with cursor.cursor.copy(f'COPY "{table}" (id, customer_id, item, amount, time) FROM STDIN') as copy:
+            for order in orders:
+                copy.write_row((order.pk, order.customer_id, order.item, order.amount, order.time))
@@ -0,0 +1,264 @@
+"""
+Caching helpers: a read-through customer cache and per-table change
+counters used to version (and cache) list responses.
+
+Customer cache
+
+Lookups go to a small in-process LRU first, then to the Django cache backend
+named by ``CUSTOMER_CACHE_ALIAS`` and finally to the database. Entries are
+dropped on ``post_save``/``post_delete`` of ``Customer`` (see core.signals),
+in this process's LRU and in the backend. With a shared backend (Redis,
+Memcached) other processes keep their LRU copy for at most
+``CUSTOMER_CACHE_LOCAL_TTL`` seconds, so that is the staleness bound across
+workers. With a process-local backend (the locmem default) the invalidation
+never reaches other workers, which keep their copy for up to
+``CUSTOMER_CACHE_TIMEOUT`` seconds. An order validated against a customer
+deleted meanwhile fails its foreign key on commit and is rejected with 400
+(see ``OrderViewSet.save_with_notification``).
+
+List versions
+    Every write to a table bumps a counter in the ``LIST_CACHE_ALIAS`` cache.
+    A list response's ETag is derived from the counters of the tables it
+    reads plus the request URL, so a conditional GET can be answered with 304
+    (and a full response served from cache) without touching the database.
+
+    The counters only work if every process that writes shares them. With a
+    process-local backend (locmem, dummy) a write in one worker or management
+    command never reaches the others, so ETags and list caching are off unless
+    ``LIST_CACHE_ALLOW_LOCAL`` says there is only one process (see core.checks).
+
+    With read replicas, each bump also records when it happened. A list read
+    from a replica is stored and given an ETag only if its tables have had no
+    write for ``REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL`` seconds. Otherwise
+    the replica might not have the write yet, and stale rows would be cached
+    under the new version.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponseNotModified
+from django.utils.cache import parse_etags
+from rest_framework.response import Response
+
+from .models import Customer
+from .replicas import current_replica
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, maxsize):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CustomerCache:
+    def __init__(self):
+        self.local = LocalLRU()
+
+    @property
+    def backend(self):
+        return caches[settings.CUSTOMER_CACHE_ALIAS]
+
+    @staticmethod
+    def primary():
+        # Fills are shared by every reader, so they never come from a lagging replica
+        return Customer.objects.using(DEFAULT_DB_ALIAS)
+
+    @staticmethod
+    def id_key(pk):
+        return f"customer:id:{pk}"
+
+    @staticmethod
+    def code_key(code):
+        return f"customer:code:{code}"
+
+    def get(self, pk):
+        """Return the customer with this primary key, or None if there is none."""
+        key = self.id_key(pk)
+        customer = self.local.get(key)
+        if customer is None:
+            customer = self.backend.get(key)
+            if customer is None:
+                customer = self.primary().filter(pk=pk).first()
+                if customer is None:
+                    return None
+                self.backend.set(key, customer, settings.CUSTOMER_CACHE_TIMEOUT)
+            self._remember(key, customer)
+        return customer
+
+    def get_by_code(self, code):
+        """Return the customer with this code, or None if there is none."""
+        key = self.code_key(code)
+        pk = self.local.get(key) or self.backend.get(key)
+        if pk is not None:
+            customer = self.get(pk)
+            # The code may have changed since the mapping was cached
+            if customer is not None and customer.code == code:
+                self._remember(key, pk)
+                return customer
+        customer = self.primary().filter(code=code).first()
+        if customer is None:
+            return None
+        self.backend.set_many({key: customer.pk, self.id_key(customer.pk): customer}, settings.CUSTOMER_CACHE_TIMEOUT)
+        self._remember(key, customer.pk)
+        self._remember(self.id_key(customer.pk), customer)
+        return customer
+
+    def invalidate(self, customer):
+        keys = [self.id_key(customer.pk), self.code_key(customer.code)]
+        for key in keys:
+            self.local.delete(key)
+        self.backend.delete_many(keys)
+
+    def clear(self):
+        """Empty the local LRU and the whole cache backend (meant for tests)."""
+        self.local.clear()
+        self.backend.clear()
+
+    def _remember(self, key, value):
+        self.local.set(key, value, settings.CUSTOMER_CACHE_LOCAL_TTL, settings.CUSTOMER_CACHE_LOCAL_SIZE)
+
+
+customer_cache = CustomerCache()
+
+
+def is_process_local(alias):
+    """Whether the cache ``alias`` is private to this process, so other workers never see its writes."""
+    return isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def list_caching_enabled():
+    return settings.LIST_CACHE_ALLOW_LOCAL or not is_process_local(settings.LIST_CACHE_ALIAS)
+
+
+def _list_backend():
+    return caches[settings.LIST_CACHE_ALIAS]
+
+
+def _version_key(table):
+    return f"tablever:{table}"
+
+
+def _written_key(table):
+    return f"tablever-at:{table}"
+
+
+def table_versions(*tables):
+    """Current change counters for ``tables``, initialising missing ones."""
+    backend = _list_backend()
+    keys = [_version_key(t) for t in tables]
+    found = backend.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock so a counter lost to eviction never repeats old values
+            backend.add(key, time.time_ns(), None)
+            found[key] = backend.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_table_version(table):
+    backend = _list_backend()
+    if settings.DATABASE_REPLICAS:
+        # Before the bump: whoever sees the new version also sees the write time
+        backend.set(_written_key(table), time.time(), None)
+    try:
+        backend.incr(_version_key(table))
+    except ValueError:
+        backend.add(_version_key(table), time.time_ns(), None)
+
+
+def written_within(seconds, *tables):
+    """Whether any of ``tables`` may have been written in the last ``seconds`` seconds."""
+    backend = _list_backend()
+    keys = [_written_key(t) for t in tables]
+    found = backend.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in found:
+            # Unknown (e.g. evicted): assume a write just now
+            backend.add(key, now, None)
+            found[key] = now
+    return any(now - found[key] < seconds for key in keys)
+
+
+def cached_list(*tables):
+    """
+    Decorate a viewset ``list`` so its response is versioned by the change
+    counters of ``tables``: matching ``If-None-Match`` requests get a 304 and
+    full responses are cached per URL for ``LIST_CACHE_TIMEOUT`` seconds.
+    Neither happens when the counters are process-local (``list_caching_enabled``).
+    """
+    def decorator(list_method):
+        @wraps(list_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not list_caching_enabled():
+                return list_method(self, request, *args, **kwargs)
+            versions = table_versions(*tables)
+            fingerprint = "|".join([
+                *map(str, versions),
+                request.get_host(),
+                request.get_full_path(),
+                request.accepted_media_type or "",
+            ])
+            digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+            etag = f'W/"{digest}"'
+
+            if etag in parse_etags(request.headers.get("If-None-Match", "")):
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                return response
+
+            if current_replica() is not None and written_within(
+                settings.REPLICA_MAX_LAG + settings.REPLICA_CHECK_INTERVAL, *tables
+            ):
+                # The replica may predate the current versions: neither cache nor tag this
+                return list_method(self, request, *args, **kwargs)
+
+            timeout = settings.LIST_CACHE_TIMEOUT
+            backend = _list_backend()
+            data = backend.get(f"list:{digest}") if timeout else None
+            if data is None:
+                response = list_method(self, request, *args, **kwargs)
+                if timeout and response.status_code == 200:
+                    backend.set(f"list:{digest}", response.data, timeout)
+            else:
+                response = Response(data)
+            response["ETag"] = etag
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+"""
+Change feed for incremental sync (``GET /api/changes/``).
+
+Every insert, update and delete of an ``Order`` or ``Customer`` writes a
+``ChangeLogEntry`` in the same transaction: through the model signals for
+ORM saves and deletes, and explicitly on the bulk paths. ``QuerySet.update()``
+and raw SQL bypass it.
+
+Entries get their ``seq`` after they commit. Ids handed out inside concurrent
+transactions can become visible out of order (id 7 commits before id 6). A
+consumer that had already read 7 would then skip 6 for good. So readers first
+run ``assign_sequence``, which numbers the committed entries that have no
+``seq`` yet, under a lock. An entry that commits later always gets a higher
+``seq``, and following ``seq`` never skips anything.
+
+Consumers keep the last ``seq`` they applied and ask for ``after=<seq>``.
+To bootstrap, read ``next`` from ``?limit=0``, then take a full export, then
+follow the feed from that ``seq``. Replaying a few changes twice is harmless:
+each entry carries the full row, or a delete. Entries older than
+``CHANGES_RETENTION_DAYS`` are removed by ``manage.py purge_changes``; a
+consumer that falls behind that gets ``410 Gone`` and must bootstrap again.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import ChangeLogEntry, Customer, Order
+from .serializers import datetime_repr, decimal_repr
+
+# Key of the PostgreSQL advisory lock serializing assign_sequence
+SEQUENCE_LOCK_ID = 0x5A7A_C4A6
+
+# Assigned values may still be strings or floats ("12.50" is valid input)
+_to_amount = Order._meta.get_field("amount").to_python
+
+
+def order_data(order):
+    return {
+        "customer": order.customer_id,
+        "item": order.item,
+        "amount": decimal_repr(_to_amount(order.amount)),
+        "time": datetime_repr(order.time),
+    }
+
+
+def customer_data(customer):
+    return {
+        "name": customer.name,
+        "code": customer.code,
+        "email": customer.email,
+        "phone_number": customer.phone_number,
+    }
+
+
+SNAPSHOTS = {Order: ("order", order_data), Customer: ("customer", customer_data)}
+
+
+def change_entry(instance, op):
+    table, snapshot = SNAPSHOTS[type(instance)]
+    data = None if op == ChangeLogEntry.OP_DELETE else snapshot(instance)
+    return ChangeLogEntry(table=table, object_id=instance.pk, op=op, data=data)
+
+
+def record_change(instance, op):
+    change_entry(instance, op).save()
+
+
+def record_changes(changes):
+    """Log ``(instance, op)`` pairs with one INSERT; call inside the writing transaction."""
+    ChangeLogEntry.objects.bulk_create(
+        [change_entry(instance, op) for instance, op in changes],
+        batch_size=settings.CHANGES_WRITE_BATCH_SIZE,
+    )
+
+
+def assign_sequence(limit=None):
+    """Give the oldest committed, unsequenced entries the next ``seq`` values. Returns how many."""
+    limit = limit or settings.CHANGES_SEQUENCE_BATCH
+    table = ChangeLogEntry._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [SEQUENCE_LOCK_ID])
+            cursor.execute(
+                f'UPDATE "{table}" SET seq = numbered.n FROM ('
+                f'  SELECT id, ROW_NUMBER() OVER (ORDER BY id)'
+                f'    + (SELECT COALESCE(MAX(seq), 0) FROM "{table}") AS n'
+                f'  FROM "{table}" WHERE seq IS NULL ORDER BY id LIMIT %s'
+                f') AS numbered WHERE "{table}".id = numbered.id',
+                [limit],
+            )
+            return cursor.rowcount
+
+
+def last_seq():
+    return ChangeLogEntry.objects.filter(seq__isnull=False).order_by("-seq").values_list("seq", flat=True).first() or 0
+
+
+class ChangesGone(Exception):
+    """Entries after the consumer's position were already purged."""
+
+
+def read_changes(after, limit):
+    """
+    Up to ``limit`` entries with ``seq > after`` as compact dicts, plus
+    whether more are waiting. Raises ChangesGone if some were purged.
+    """
+    assign_sequence()
+    rows = list(
+        ChangeLogEntry.objects.filter(seq__gt=after)
+        .order_by("seq")
+        .values_list("seq", "table", "object_id", "op", "data", "created_at")[:limit + 1]
+    )
+    # seq values are consecutive, so a hole right after ``after`` means a purge
+    if after and rows and rows[0][0] != after + 1:
+        raise ChangesGone
+    changes = [
+        {"seq": seq, "table": table, "id": object_id, "op": op, "data": data, "at": datetime_repr(created_at)}
+        for seq, table, object_id, op, data, created_at in rows[:limit]
+    ]
+    return changes, len(rows) > limit
+
+
+def wait_for_changes(after, limit, wait):
+    """``read_changes``, polling every ``CHANGES_POLL_INTERVAL`` seconds for up to ``wait`` seconds."""
+    deadline = time.monotonic() + wait
+    while True:
+        changes, has_more = read_changes(after, limit)
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes, has_more
+        time.sleep(min(settings.CHANGES_POLL_INTERVAL, remaining))
@@ -0,0 +1,20 @@
+"""System checks for deployment settings the app relies on."""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import list_caching_enabled
+
+
+@register(Tags.caches)
+def check_list_cache(app_configs, **kwargs):
+    if list_caching_enabled():
+        return []
+    return [
+        Warning(
+            f"LIST_CACHE_ALIAS ({settings.LIST_CACHE_ALIAS!r}) is a process-local cache, "
+            "so list ETags and response caching are disabled.",
+            hint="Point it at a cache shared by every worker (e.g. Redis), "
+                 "or set LIST_CACHE_ALLOW_LOCAL=True when a single process serves and writes.",
+            id="core.W001",
+        )
+    ]
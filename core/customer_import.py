@@ -0,0 +1,204 @@
+"""
+Streaming customer upsert shared by ``POST /api/customers/bulk-upsert/`` and
+``manage.py import_customers``.
+
+Input is CSV (header row with ``code``, ``name`` and optionally ``email`` and
+``phone_number``) or NDJSON objects with the same keys. Rows are read lazily,
+validated a chunk at a time and written with one
+``INSERT ... ON CONFLICT (code) DO UPDATE`` per chunk, so memory use is
+bounded by ``CUSTOMERS_UPSERT_CHUNK_SIZE`` rather than the file size.
+
+Each chunk commits on its own. If an import stops halfway, the chunks already
+written stay; running the same file again is safe because rows are keyed on
+``code``. A row replaces the customer's name, email and phone number; empty
+values clear the optional fields. Phone numbers are stored in E.164.
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+from django.db import transaction
+
+from . import changes
+from .cache import bump_table_version, customer_cache
+from .models import ChangeLogEntry, Customer
+from .phones import normalize_phone
+
+IMPORT_FORMATS = ("csv", "ndjson")
+UPSERT_FIELDS = ("name", "email", "phone_number", "phone_e164")
+
+_NAME_MAX = Customer._meta.get_field("name").max_length
+_CODE_MAX = Customer._meta.get_field("code").max_length
+_EMAIL_MAX = Customer._meta.get_field("email").max_length
+_email_validator = EmailValidator()
+
+
+class ImportResult:
+    """Running totals of an import; ``errors`` keeps the first ``max_errors`` rejections."""
+
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = settings.CUSTOMERS_UPSERT_MAX_ERRORS if max_errors is None else max_errors
+
+    def reject(self, row_number, errors):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {"created": self.created, "updated": self.updated, "rejected": self.rejected, "errors": self.errors}
+
+
+def decode_lines(lines, encoding="utf-8-sig"):
+    """Decode an iterable of byte lines incrementally (dropping a leading BOM)."""
+    return codecs.iterdecode(lines, encoding)
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield ``(row number, dict or None, error)`` from text lines. Row numbers
+    count data rows from 1 (the CSV header is not a row); blank NDJSON lines
+    are skipped but still counted, so numbers match line numbers.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        missing = {"code", "name"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"CSV header is missing: {', '.join(sorted(missing))}.")
+        for number, row in enumerate(reader, start=1):
+            yield number, row, None
+        return
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Expected a JSON object."
+            continue
+        yield number, row, None
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def clean_rows(chunk):
+    """
+    Validate a chunk in one pass with precompiled patterns.
+    Returns ``(valid, rejected)``: ``(number, fields)`` and ``(number, errors)`` pairs.
+    """
+    valid, rejected = [], []
+    for number, row, error in chunk:
+        if error:
+            rejected.append((number, {"non_field_errors": [error]}))
+            continue
+        code, name = _text(row.get("code")), _text(row.get("name"))
+        email = _text(row.get("email")).lower()
+        phone = _text(row.get("phone_number"))
+        phone_e164 = normalize_phone(phone)
+
+        errors = {}
+        if not code:
+            errors["code"] = ["This field is required."]
+        elif len(code) > _CODE_MAX:
+            errors["code"] = [f"Ensure this field has no more than {_CODE_MAX} characters."]
+        if not name:
+            errors["name"] = ["This field is required."]
+        elif len(name) > _NAME_MAX:
+            errors["name"] = [f"Ensure this field has no more than {_NAME_MAX} characters."]
+        if email:
+            try:
+                _email_validator(email)
+            except ValidationError:
+                errors["email"] = ["Enter a valid email address."]
+            else:
+                if len(email) > _EMAIL_MAX:
+                    errors["email"] = [f"Ensure this field has no more than {_EMAIL_MAX} characters."]
+        if phone and phone_e164 is None:
+            errors["phone_number"] = ["Enter a valid phone number, e.g. +254700000000 or 0700000000."]
+
+        if errors:
+            rejected.append((number, errors))
+        else:
+            valid.append((number, {
+                "code": code,
+                "name": name,
+                "email": email or None,
+                "phone_number": phone_e164,
+                "phone_e164": phone_e164,
+            }))
+    return valid, rejected
+
+
+def upsert_chunk(valid, result):
+    """Write validated rows (later rows win for a repeated code) and update ``result``."""
+    if not valid:
+        return
+    latest = {}
+    for _, fields in valid:
+        latest[fields["code"]] = fields
+    existing = dict(Customer.objects.filter(code__in=latest).values_list("code", "id"))
+
+    seen = set(existing)
+    for _, fields in valid:
+        if fields["code"] in seen:
+            result.updated += 1
+        else:
+            result.created += 1
+            seen.add(fields["code"])
+
+    with transaction.atomic():
+        # ON CONFLICT may touch a row once per statement, hence the de-duplication above
+        customers = Customer.objects.bulk_create(
+            [Customer(**fields) for fields in latest.values()],
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=[*UPSERT_FIELDS, "updated_at"],
+        )
+        # bulk_create skips the model signals, so log changes, drop cached copies and bump list versions here
+        changes.record_changes(
+            (c, ChangeLogEntry.OP_UPDATE if c.code in existing else ChangeLogEntry.OP_INSERT) for c in customers
+        )
+        stale = [Customer(pk=pk, code=code) for code, pk in existing.items()]
+        _invalidate(stale)
+        transaction.on_commit(lambda: _invalidate(stale))
+
+
+def _invalidate(customers):
+    for customer in customers:
+        customer_cache.invalidate(customer)
+    bump_table_version("customer")
+
+
+def upsert_customers(lines, fmt, chunk_size=None, max_errors=None):
+    """
+    Upsert customers from text ``lines`` in ``fmt`` (``csv`` or ``ndjson``).
+    Raises ValueError for an unusable CSV header; bad rows are counted and
+    reported in the returned ImportResult instead.
+    """
+    chunk_size = chunk_size or settings.CUSTOMERS_UPSERT_CHUNK_SIZE
+    result = ImportResult(max_errors)
+    rows = iter_rows(lines, fmt)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        valid, rejected = clean_rows(chunk)
+        for number, errors in rejected:
+            result.reject(number, errors)
+        upsert_chunk(valid, result)
@@ -0,0 +1,72 @@
+"""
+Streaming order export shared by ``GET /api/orders/export/`` and
+``manage.py export_orders``.
+
+Rows are read with ``.values_list().iterator()`` (a server-side cursor on
+PostgreSQL) and encoded one at a time, so memory use does not depend on
+the number of orders exported.
+"""
+import csv
+import json
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order
+from .serializers import datetime_repr, decimal_repr
+
+EXPORT_FIELDS = ("id", "customer", "item", "amount", "time")
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime into an aware datetime; raise ValueError if invalid."""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value!r}")
+        since = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.get_default_timezone())
+    return since
+
+
+def order_rows(since=None, until=None, chunk_size=None):
+    """Yield export rows (``since <= time < until``) as tuples of strings/ints, oldest first."""
+    queryset = Order.objects.order_by("time", "id")
+    if since is not None:
+        queryset = queryset.filter(time__gte=since)
+    if until is not None:
+        queryset = queryset.filter(time__lt=until)
+    rows = queryset.values_list("id", "customer_id", "item", "amount", "time").iterator(
+        chunk_size=chunk_size or settings.ORDERS_EXPORT_CHUNK_SIZE
+    )
+    for pk, customer_id, item, amount, time in rows:
+        yield (pk, customer_id, item, decimal_repr(amount), datetime_repr(time))
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer streaming."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_lines(export_format, since=None, until=None, chunk_size=None):
+    encode = csv_lines if export_format == "csv" else ndjson_lines
+    return encode(order_rows(since=since, until=until, chunk_size=chunk_size))
@@ -0,0 +1,104 @@
+"""
+Query parameter filters for ``GET /api/orders/``.
+
+    customer=<id>            customer_code=<code>
+    time__gte=<date|datetime>   time__lte=<date|datetime>   (a date covers the whole day)
+    amount__gte=<decimal>    amount__lte=<decimal>
+    item=<prefix>            search=<text>  (case-insensitive, anywhere in the item)
+
+Each filter is backed by an index (see migration 0008): ``(customer, -time,
+-id)`` serves customer lists in pagination order, ``varchar_pattern_ops`` on
+``item`` serves prefixes and a ``pg_trgm`` GIN index on ``UPPER(item)``
+serves ``search``.
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .cache import customer_cache
+from .export import parse_since
+
+ORDER_FILTER_PARAMS = (
+    "customer", "customer_code", "time__gte", "time__lte", "amount__gte", "amount__lte", "item", "search",
+)
+
+
+# Primary keys are BigAutoField; larger values overflow the database driver
+MAX_ID = 2 ** 63 - 1
+
+
+def _parse_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError("A valid integer is required.")
+    if not -MAX_ID - 1 <= number <= MAX_ID:
+        raise ValueError(f"Ensure this value is between {-MAX_ID - 1} and {MAX_ID}.")
+    return number
+
+
+def _parse_decimal(value):
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError("A valid number is required.")
+    return amount
+
+
+def filter_orders(queryset, params):
+    """Apply the order filters present in ``params``; raise ValidationError on bad values."""
+    lookups, errors = {}, {}
+
+    def parse(name, parser):
+        value = params.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            return parser(value)
+        except ValueError as e:
+            errors[name] = [str(e)]
+            return None
+
+    customer_id = parse("customer", _parse_int)
+    if customer_id is not None:
+        lookups["customer_id"] = customer_id
+
+    since = parse("time__gte", parse_since)
+    if since is not None:
+        lookups["time__gte"] = since
+    until = parse("time__lte", parse_since)
+    if until is not None:
+        if parse_date(params["time__lte"]) is not None:
+            # A bare date includes that whole day
+            lookups["time__lt"] = until + timedelta(days=1)
+        else:
+            lookups["time__lte"] = until
+
+    for name in ("amount__gte", "amount__lte"):
+        amount = parse(name, _parse_decimal)
+        if amount is not None:
+            lookups[name] = amount
+
+    prefix = params.get("item")
+    if prefix:
+        lookups["item__startswith"] = prefix
+    search = params.get("search")
+    if search:
+        lookups["item__icontains"] = search
+
+    if errors:
+        raise ValidationError(errors)
+
+    code = params.get("customer_code")
+    if code:
+        # Resolve through the cache so the list query needs no join
+        customer = customer_cache.get_by_code(code)
+        if customer is None:
+            return queryset.none()
+        if lookups.setdefault("customer_id", customer.pk) != customer.pk:
+            return queryset.none()
+    return queryset.filter(**lookups) if lookups else queryset
@@ -0,0 +1,132 @@
+"""
+``Idempotency-Key`` support for POST endpoints.
+
+The first request with a key inserts an ``IdempotencyKey`` row in its own
+short transaction; the unique ``(scope, key)`` constraint decides which of
+several concurrent duplicates gets to run, so no lock is held across the
+request. The winner stores its response in the same transaction as the rows
+it created. Later requests with the same key are answered from that row:
+
+* same payload, finished  -> the stored response, with ``Idempotent-Replayed: true``
+* same payload, running   -> ``409`` with ``Retry-After``
+* different payload       -> ``422``
+
+If the view raises, the row is deleted so the client can retry. Rows expire
+after ``IDEMPOTENCY_KEY_TTL`` seconds (``manage.py purge_idempotency_keys``);
+a row left in progress longer than ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds (a
+crashed worker) is taken over by the next retry.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def request_hash(request) -> str:
+    """Fingerprint of what the client asked for: method, path and parsed body."""
+    body = json.dumps(request.data, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode("utf-8")).hexdigest()
+
+
+def claim(scope: str, key: str, fingerprint: str):
+    """
+    Insert the key, or return the row that already holds it.
+    Returns ``(row, created)``.
+    """
+    now = timezone.now()
+    for _ in range(3):
+        # Retries are the common duplicate, so look before trying to insert
+        row = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if row is not None:
+            stale = row.status_code is None and row.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+            if row.expires_at > now and not stale:
+                return row, False
+            # Expired or abandoned: remove it (unless someone else just did) and insert again
+            IdempotencyKey.objects.filter(pk=row.pk, created_at=row.created_at).delete()
+        try:
+            with transaction.atomic():
+                row = IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=fingerprint,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+            return row, True
+        except IntegrityError:
+            # A concurrent duplicate inserted it first; read its row
+            continue
+    raise IntegrityError(f"Could not claim idempotency key {key!r} in scope {scope!r}.")
+
+
+def existing_response(row, fingerprint):
+    if row.request_hash != fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if row.status_code is None:
+        return Response(
+            {"detail": "A request with this Idempotency-Key is still being processed."},
+            status=status.HTTP_409_CONFLICT,
+            headers={"Retry-After": "1"},
+        )
+    return Response(row.response_body, status=row.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(scope):
+    """
+    Decorate a viewset action so requests carrying ``Idempotency-Key`` run at
+    most once per authenticated user, ``scope`` and key.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise ValidationError({HEADER: [f"At most {MAX_KEY_LENGTH} characters."]})
+
+            fingerprint = request_hash(request)
+            row, created = claim(f"{scope}:{request.user.pk}", key, fingerprint)
+            if not created:
+                return existing_response(row, fingerprint)
+
+            try:
+                with transaction.atomic():
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code >= 500:
+                        raise _Unstored(response)
+                    row.status_code = response.status_code
+                    row.response_body = response.data
+                    row.save(update_fields=["status_code", "response_body"])
+            except _Unstored as e:
+                row.delete()
+                return e.response
+            except BaseException:
+                row.delete()
+                raise
+            return response
+        return wrapper
+    return decorator
+
+
+class _Unstored(Exception):
+    """Rolls back a server-error response instead of storing it."""
+
+    def __init__(self, response):
+        self.response = response
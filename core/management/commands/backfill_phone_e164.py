@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import customer_cache
+from core.models import Customer
+from core.phones import normalize_phone
+
+
+class Command(BaseCommand):
+    help = "Fill Customer.phone_e164 from phone_number in primary key order, one batch per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Customers read and updated per transaction.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk, scanned, updated = 0, 0, 0
+        while True:
+            rows = list(
+                Customer.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "code", "phone_number", "phone_e164")[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            scanned += len(rows)
+            changed = [
+                Customer(pk=pk, code=code, phone_e164=normalize_phone(phone))
+                for pk, code, phone, current in rows
+                if normalize_phone(phone) != current
+            ]
+            if changed:
+                with transaction.atomic():
+                    Customer.objects.bulk_update(changed, ["phone_e164"])
+                for customer in changed:
+                    customer_cache.invalidate(customer)
+                updated += len(changed)
+        self.stdout.write(f"Scanned {scanned} customer(s), updated phone_e164 on {updated}.")
@@ -0,0 +1,113 @@
+import json
+import os
+import platform
+from urllib.parse import urljoin
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.bench import baseline as baselines
+from core.bench.data import seed
+from core.bench.http import run_load
+from core.bench.scenarios import default_scenarios, make_clients, run_all
+from core.models import Order
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(baselines.__file__), "baseline.json")
+BENCH_PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the REST API in-process (on a throwaway test database) and compare "
+        "against the committed baseline. Use --check in CI to fail on regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--scenario", action="append", dest="scenarios", help="Only run this scenario (repeatable).")
+        parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+        parser.add_argument("--check", action="store_true", help="Exit non-zero when results regress against the baseline.")
+        parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with these results.")
+        parser.add_argument("--tolerance", type=float, default=baselines.DEFAULT_TOLERANCE)
+        parser.add_argument("--http", metavar="BASE_URL", help="Benchmark a running server over HTTP instead.")
+        parser.add_argument("--header", action="append", default=[], metavar="NAME:VALUE",
+                            help="Extra header for --http mode, e.g. a session cookie.")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+
+    def handle(self, *args, **options):
+        if options["http"]:
+            results = self.run_http(options)
+        else:
+            results = self.run_in_process(options)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for r in results:
+                self.stdout.write(
+                    f"{r['name']:28} {r['rps']:>9} req/s  p50 {r['p50_ms']:>8}ms  p95 {r['p95_ms']:>8}ms  "
+                    f"p99 {r['p99_ms']:>8}ms  queries {r.get('queries', '-'):>5}  alloc {r.get('alloc_kib', '-')} KiB"
+                )
+
+        if options["save_baseline"]:
+            baselines.save(options["baseline"], results, meta={
+                "customers": options["customers"],
+                "orders": options["orders"],
+                "iterations": options["iterations"],
+                "python": platform.python_version(),
+                "database": connection.vendor,
+            })
+            self.stdout.write(f"Baseline written to {options['baseline']}.")
+
+        if options["check"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No baseline at {options['baseline']}; run with --save-baseline first.")
+            regressions = baselines.compare(results, baselines.load(options["baseline"]), options["tolerance"])
+            if regressions:
+                raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write("No regressions against the baseline.")
+
+    # Everything runs in this process, so a local list cache stays coherent
+    @override_settings(LIST_CACHE_ALLOW_LOCAL=True)
+    def run_in_process(self, options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = User.objects.create_user("bench", "bench@example.com", BENCH_PASSWORD)
+            customer_ids = seed(customers=options["customers"], orders=options["orders"])
+            order_ids = list(Order.objects.values_list("id", flat=True)[:1000])
+            scenarios = default_scenarios(customer_ids, order_ids)
+            return run_all(
+                scenarios,
+                make_clients(user, BENCH_PASSWORD),
+                iterations=options["iterations"],
+                only=options["scenarios"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_http(self, options):
+        headers = {}
+        for header in options["header"]:
+            name, _, value = header.partition(":")
+            headers[name.strip()] = value.strip()
+        paths = {
+            "customer_list": "/api/customers/",
+            "order_list": "/api/orders/",
+            "order_list_expand": "/api/orders/?expand=customer",
+            "health": "/api/health/",
+        }
+        results = []
+        for name, path in paths.items():
+            if options["scenarios"] and name not in options["scenarios"]:
+                continue
+            result = run_load(urljoin(options["http"], path), total_requests=options["iterations"] * 10,
+                              concurrency=8, headers=headers)
+            results.append({"name": name, **result})
+        return results
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.bench.http import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/second and latency of a running server, e.g. to compare "
+        "runserver with gunicorn or CONN_MAX_AGE=0 with persistent connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Endpoint to hit (repeatable). Defaults to the order endpoints.",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--user", help="Basic auth username (each request pays for a password hash).")
+        parser.add_argument("--password", default="")
+        parser.add_argument("--header", action="append", default=[], metavar="NAME:VALUE",
+                            help="Extra request header, e.g. 'Cookie: sessionid=...' (repeatable).")
+        parser.add_argument("--create-order", type=int, metavar="CUSTOMER_ID",
+                            help="Also benchmark POST /api/orders/ for this customer.")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+
+    def handle(self, *args, **options):
+        auth = (options["user"], options["password"]) if options["user"] else None
+        base = options["base_url"].rstrip("/")
+        headers = {}
+        for header in options["header"]:
+            name, _, value = header.partition(":")
+            headers[name.strip()] = value.strip()
+        runs = [("GET", path, None) for path in options["paths"] or ["/api/orders/", "/api/health/"]]
+        if options["create_order"]:
+            body = json.dumps({"customer": options["create_order"], "item": "bench", "amount": "1.00"})
+            runs.append(("POST", "/api/orders/", body))
+
+        results = []
+        for method, path, body in runs:
+            results.append(run_load(
+                base + path,
+                total_requests=options["requests"],
+                concurrency=options["concurrency"],
+                method=method,
+                body=body,
+                headers={**headers, "Content-Type": "application/json"} if body else headers,
+                auth=auth,
+            ))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"{r['method']:4} {r['url']}: {r['rps']} req/s  p50 {r['p50_ms']}ms  "
+                f"p95 {r['p95_ms']}ms  p99 {r['p99_ms']}ms  statuses {r['statuses']}"
+            )
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.bench.encoding import PER_ROWS, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare response formats (DRF JSON, orjson, MessagePack, Arrow) on OrderSerializer "
+        "and CustomerSerializer output: bytes, gzipped bytes and CPU per 10k rows. No database needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=PER_ROWS, help="Rows per payload.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed renders per format.")
+        parser.add_argument("--format", action="append", dest="formats",
+                            help="Only run this format: json, orjson, msgpack or arrow (repeatable).")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+
+    def handle(self, *args, **options):
+        results = run(rows=options["rows"], repeat=options["repeat"], only=options["formats"])
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        baseline = {r["serializer"]: r for r in results if r["format"] == "json"}
+        for r in results:
+            base = baseline.get(r["serializer"])
+            speedup = f"  x{base['cpu_ms_per_10k'] / r['cpu_ms_per_10k']:.1f}" if base and r["cpu_ms_per_10k"] else ""
+            self.stdout.write(
+                f"{r['serializer']:8} {r['format']:8} {r['bytes_per_10k']:>9} B  "
+                f"gzip {r['gzip_bytes_per_10k']:>8} B  cpu {r['cpu_ms_per_10k']:>8} ms/10k{speedup}"
+            )
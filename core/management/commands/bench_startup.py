@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bench.startup import measure_profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold-start cost per settings profile: wall time of 'manage.py check' "
+        "in a fresh interpreter and import time by package (python -X importtime)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default="full,api,worker",
+                            help="Comma-separated SAVANNAH_PROFILE values to compare.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per profile.")
+        parser.add_argument("--top", type=int, default=10, help="Packages listed per profile.")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+
+    def handle(self, *args, **options):
+        results = []
+        for profile in filter(None, (p.strip() for p in options["profiles"].split(","))):
+            try:
+                results.append(measure_profile(profile, repeat=options["repeat"], top=options["top"]))
+            except RuntimeError as e:
+                raise CommandError(str(e))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"{r['profile']:7} check median {r['check_median_s']}s (min {r['check_min_s']}s)  "
+                f"imports {r['import_ms']}ms over {r['modules']} modules"
+            )
+            for name, ms in r["top_packages"]:
+                self.stdout.write(f"          {name:24} {ms}ms")
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.async_sms import aclose
+from core.outbox import adispatch_batch, dispatch_batch
+
+
+class Command(BaseCommand):
+    help = "Send pending SMS notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.SMS_OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.SMS_OUTBOX_POLL_INTERVAL,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain due notifications and exit.")
+        parser.add_argument(
+            "--async",
+            dest="use_async",
+            action="store_true",
+            help="Send over the async gateway client, up to SMS_ASYNC_MAX_CONCURRENCY calls in flight.",
+        )
+
+    def handle(self, *args, **options):
+        if options["use_async"]:
+            total = async_to_sync(self.drain_async)(options)
+        else:
+            total = self.drain(options)
+        self.stdout.write(f"Processed {total} notification(s).")
+
+    def drain(self, options):
+        total = 0
+        while True:
+            processed = dispatch_batch(options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if options["once"]:
+                return total
+            time.sleep(options["interval"])
+
+    async def drain_async(self, options):
+        total = 0
+        try:
+            while True:
+                processed = await adispatch_batch(options["batch_size"])
+                total += processed
+                if processed:
+                    continue
+                if options["once"]:
+                    return total
+                await asyncio.sleep(options["interval"])
+        finally:
+            await aclose()
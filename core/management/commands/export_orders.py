@@ -0,0 +1,39 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import EXPORT_FORMATS, export_lines, parse_since
+
+
+class Command(BaseCommand):
+    help = "Stream orders to a file as NDJSON or CSV (gzip-compressed when the name ends in .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--since", help="Only orders placed at or after this ISO date/datetime.")
+        parser.add_argument("--output", "-o", default="-", help="Output path, '-' for stdout.")
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = parse_since(options["since"])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        lines = export_lines(options["format"], since=since, chunk_size=options["chunk_size"])
+        output = options["output"]
+        count = -1 if options["format"] == "csv" else 0
+        if output == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+                count += 1
+            return
+
+        opener = gzip.open if output.endswith(".gz") else open
+        with opener(output, "wt", encoding="utf-8", newline="") as fh:
+            for line in lines:
+                fh.write(line)
+                count += 1
+        self.stderr.write(f"Exported {count} order(s) to {output}.")
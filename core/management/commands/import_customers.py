@@ -0,0 +1,54 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.customer_import import IMPORT_FORMATS, decode_lines, upsert_customers
+
+
+class Command(BaseCommand):
+    help = "Create or update customers by code from a CSV or NDJSON file (gzip-compressed when the name ends in .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input path, '-' for stdin.")
+        parser.add_argument("--format", choices=IMPORT_FORMATS,
+                            help="Input format; guessed from the file extension when omitted.")
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or self.guess_format(path)
+
+        if path == "-":
+            result = self.run(decode_lines(sys.stdin.buffer), fmt, options)
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rb") as fh:
+                    result = self.run(decode_lines(fh), fmt, options)
+            except OSError as e:
+                raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result.rejected > len(result.errors):
+            self.stderr.write(f"... and {result.rejected - len(result.errors)} more rejected row(s).")
+        self.stdout.write(
+            f"Created {result.created}, updated {result.updated}, rejected {result.rejected} customer row(s)."
+        )
+
+    def run(self, lines, fmt, options):
+        try:
+            return upsert_customers(lines, fmt, chunk_size=options["chunk_size"])
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+    @staticmethod
+    def guess_format(path):
+        name = path.removesuffix(".gz")
+        for fmt in IMPORT_FORMATS:
+            if name.endswith(f".{fmt}"):
+                return fmt
+        if name.endswith(".jsonl"):
+            return "ndjson"
+        raise CommandError("Cannot tell the format from the file name; pass --format.")
@@ -0,0 +1,80 @@
+import gzip
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import partitions
+from core.export import export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions of core_order and archive (export, then detach) "
+        "partitions older than the retention window. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="Convert core_order to a partitioned table first if it is not one yet.")
+        parser.add_argument("--months-ahead", type=int, default=settings.ORDERS_PARTITION_PREMAKE_MONTHS)
+        parser.add_argument("--retention-months", type=int, default=settings.ORDERS_PARTITION_RETENTION_MONTHS,
+                            help="Whole months kept before the current one; 0 keeps everything.")
+        parser.add_argument("--archive-dir", default=settings.ORDERS_PARTITION_ARCHIVE_DIR)
+        parser.add_argument("--drop", action="store_true", help="Drop archived partitions instead of keeping them detached.")
+        parser.add_argument("--dry-run", action="store_true", help="Print what would be done.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Order partitioning needs PostgreSQL.")
+        dry_run = options["dry_run"]
+
+        if not partitions.is_partitioned():
+            if not options["convert"]:
+                raise CommandError(f"{partitions.TABLE} is not partitioned; run with --convert.")
+            self.stdout.write(f"Converting {partitions.TABLE} to monthly partitions...")
+            if not dry_run:
+                with transaction.atomic():
+                    moved = partitions.convert_to_partitioned(months_ahead=options["months_ahead"])
+                self.stdout.write(f"Moved {moved} order(s).")
+
+        existing = partitions.existing_partitions()
+        today = timezone.now().date()
+
+        for month in partitions.partitions_to_create(today, options["months_ahead"], existing):
+            self.stdout.write(f"Creating {partitions.partition_name(month)}")
+            if not dry_run:
+                with connection.cursor() as cursor:
+                    cursor.execute(partitions.create_partition_sql(month))
+
+        for name in partitions.partitions_to_archive(today, options["retention_months"], existing):
+            path = os.path.join(options["archive_dir"], f"{name}.csv.gz")
+            self.stdout.write(f"Archiving {name} to {path}")
+            if dry_run:
+                continue
+            self.export(name, path)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{partitions.TABLE}" DETACH PARTITION "{name}"')
+                if options["drop"]:
+                    cursor.execute(f'DROP TABLE "{name}"')
+
+    def export(self, name, path):
+        """Write the partition's rows as gzipped CSV; the file only appears once complete."""
+        month = partitions.partition_month(name)
+        # Partition bounds are UTC month boundaries
+        since = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+        end = partitions.add_months(month, 1)
+        until = datetime(end.year, end.month, 1, tzinfo=dt_timezone.utc)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        partial = f"{path}.partial"
+        count = -1
+        with gzip.open(partial, "wt", encoding="utf-8", newline="") as fh:
+            for line in export_lines("csv", since=since, until=until):
+                fh.write(line)
+                count += 1
+        os.replace(partial, path)
+        self.stdout.write(f"Exported {count} order(s) from {name}.")
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from core.changes import last_seq
+from core.models import ChangeLogEntry
+
+
+class Command(BaseCommand):
+    help = "Delete change feed entries older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="Keep this many days of changes (default CHANGES_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows deleted per statement, to keep each delete short.")
+
+    def handle(self, *args, **options):
+        days = settings.CHANGES_RETENTION_DAYS if options["days"] is None else options["days"]
+        cutoff = timezone.now() - timedelta(days=days)
+        # Remove a prefix of the sequence only, so the feed never has holes in the middle,
+        # and keep the newest sequenced entry: new seq values continue from it.
+        # Unsequenced entries have not been offered to consumers yet and stay.
+        first_kept = ChangeLogEntry.objects.filter(seq__isnull=False, created_at__gte=cutoff).aggregate(
+            seq=Min("seq")
+        )["seq"]
+        boundary = (last_seq() if first_kept is None else first_kept) - 1
+        total = 0
+        while True:
+            ids = list(
+                ChangeLogEntry.objects.filter(seq__lte=boundary)
+                .order_by("seq")
+                .values_list("id", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted, _ = ChangeLogEntry.objects.filter(id__in=ids).delete()
+            total += deleted
+        self.stdout.write(f"Deleted {total} change log row(s).")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-customer daily order rollups from the orders table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int, action="append", dest="customers",
+                            help="Only rebuild this customer id (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild(customer_ids=options["customers"], batch_size=options["batch_size"])
+        self.stdout.write(f"Rebuilt {count} rollup row(s).")
@@ -0,0 +1,347 @@
+"""
+In-process request metrics and an opt-in sampling profiler.
+
+``MetricsMiddleware`` times every request and files the result under the
+resolved view name (``order-list``, ``customer-detail``, ...):
+
+    savannah_requests_total{view, method, status}
+    savannah_request_duration_seconds{view}      wall time
+    savannah_request_db_seconds{view}            time inside database calls
+    savannah_request_queries{view}               number of database calls
+    savannah_request_<component>_seconds{view}   time inside ``timed(component)``
+                                                 blocks: serializer, sms, oidc
+
+Component histograms are only observed for requests that used the component.
+Everything is kept per process and served in the Prometheus text format at
+``/metrics``; scrape each worker (or run a single worker per container).
+
+Per-request totals live in a ``ContextVar``, so ``timed`` blocks and database
+calls made in ``sync_to_async`` threads are attributed to the right request.
+
+With ``PROFILE_SLOW_REQUESTS_MS`` set, sync requests are sampled every
+``PROFILE_SAMPLE_INTERVAL_MS`` and those slower than the threshold have their
+stacks written to ``PROFILE_DIR`` in folded format (``a;b;c <count>``), ready
+for flamegraph.pl or speedscope.
+"""
+import contextvars
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+
+# Seconds; roughly Prometheus' defaults, extended down for sub-millisecond parts
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("db", "queries", "components")
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.components = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms and counters keyed by ``(name, labels)``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = Counter()
+
+    def observe(self, name, labels, value, buckets=TIME_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] += amount
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self, name, labels):
+        """``(count, sum)`` of a histogram, or None (for tests and debugging)."""
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            return None if histogram is None else (histogram.count, histogram.sum)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()
+            )
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+registry = Registry()
+
+
+def _add_component(name, elapsed):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.components[name] = stats.components.get(name, 0.0) + elapsed
+
+
+class timed:
+    """
+    Attribute time to a request component (``serializer``, ``sms``, ``oidc``).
+    Works as a context manager, or as a decorator for functions and coroutines.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _add_component(self.name, time.perf_counter() - self._start)
+
+    def __call__(self, func):
+        name = self.name
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting calls and time for the current request."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver: wrap every new connection's queries."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class StackSampler:
+    """
+    One daemon thread sampling the stacks of registered threads with
+    ``sys._current_frames()``. Started on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        self._thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[fold_stack(frame)] += 1
+
+
+def fold_stack(frame):
+    """``file:function;...`` from the outermost frame to ``frame``."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+sampler = StackSampler()
+
+
+def write_profile(view, elapsed, samples):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = f"{view.replace(':', '_')}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.folded"
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as fh:
+        for stack, count in samples.most_common():
+            fh.write(f"{stack} {count}\n")
+    return path
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name or match._func_path
+
+
+def record_request(request, response, stats, elapsed):
+    view = view_name(request)
+    labels = (("view", view),)
+    registry.inc("savannah_requests_total", (("view", view), ("method", request.method), ("status", str(response.status_code))))
+    registry.observe("savannah_request_duration_seconds", labels, elapsed)
+    registry.observe("savannah_request_db_seconds", labels, stats.db)
+    registry.observe("savannah_request_queries", labels, stats.queries, COUNT_BUCKETS)
+    for component, seconds in stats.components.items():
+        registry.observe(f"savannah_request_{component}_seconds", labels, seconds)
+    return view
+
+
+class MetricsMiddleware:
+    """Times each request; see the module docstring. Sync and async capable."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        threshold = settings.PROFILE_SLOW_REQUESTS_MS
+        thread_id = threading.get_ident()
+        if threshold:
+            sampler.start(thread_id)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            samples = sampler.stop(thread_id) if threshold else None
+        view = record_request(request, response, stats, elapsed)
+        if samples and elapsed * 1000 >= threshold:
+            write_profile(view, elapsed, samples)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        # Async requests share the event loop thread, so they are not sampled
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+        record_request(request, response, stats, elapsed)
+        return response
+
+
+def metrics_view(request):
+    """
+    ``GET /metrics``: Prometheus text format. Requires ``METRICS_TOKEN`` as a
+    Bearer token; without one the endpoint is hidden (404) unless
+    ``METRICS_PUBLIC`` opts in to open access.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not constant_time_compare(supplied, token):
+            return HttpResponseForbidden()
+    elif not settings.METRICS_PUBLIC:
+        return HttpResponseNotFound()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_order_time_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('last_order_time', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_days', to='core.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('customer', 'day'), name='core_customer_order_day_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        # Build the composite index before dropping the single-column one it replaces
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-time', '-id'], name='core_order_customer_time_idx'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='core.customer'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# PostgreSQL only, so they are not part of the model state: other databases
+# serve item filters with a scan.
+INDEXES = [
+    # item=<prefix> (LIKE 'abc%' regardless of the database collation)
+    ("core_order_item_prefix_idx", 'ON core_order (item varchar_pattern_ops)'),
+    # search=<text>, i.e. UPPER(item) LIKE UPPER('%abc%') from __icontains
+    ("core_order_item_trgm_idx", 'ON core_order USING gin (UPPER(item) gin_trgm_ops)'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, definition in INDEXES:
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; it keeps the
+    # orders table writable while the indexes build
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_order_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes, elidable=False),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_orders(apps, schema_editor):
+    # Opt-in (ORDERS_PARTITIONED) and PostgreSQL only; see core.partitions.
+    # Setting it later? Run ``manage.py manage_partitions --convert`` instead.
+    from core import partitions
+
+    connection = schema_editor.connection
+    if not settings.ORDERS_PARTITIONED or connection.vendor != 'postgresql':
+        return
+    if partitions.is_partitioned(connection):
+        return
+    partitions.convert_to_partitioned(connection, months_ahead=settings.ORDERS_PARTITION_PREMAKE_MONTHS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_order_item_indexes'),
+    ]
+
+    operations = [
+        # Not reversed: going back to a plain table is a dump and reload
+        migrations.RunPython(partition_orders, migrations.RunPython.noop, elidable=False),
+    ]
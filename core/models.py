@@ -1,4 +1,8 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .phones import normalize_phone
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -6,15 +10,156 @@ class Customer(models.Model):
     # added phone_number so we can send SMS alerts
     email = models.EmailField(max_length=100, blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
+    # phone_number in E.164, maintained by save(); None when it is not a valid number
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True, db_index=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.phone_number)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone_number" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_e164"}
+        with _write_transaction(self, kwargs):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.name} ({self.code})'
 
+def _write_transaction(instance, save_kwargs):
+    """
+    Transaction around a save, so post_save handlers (change log, rollups)
+    commit or roll back together with the row itself.
+    """
+    using = save_kwargs.get("using") or router.db_for_write(type(instance), instance=instance)
+    return transaction.atomic(using=using, savepoint=False)
+
+
 class Order(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    # Indexed by core_order_customer_time_idx, which leads with customer_id
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders', db_index=False)
     item = models.CharField(max_length=200)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves the (time, id) keyset pagination of the orders list
+            models.Index(fields=['-time', '-id'], name='core_order_time_id_idx'),
+            # Per-customer lists and time ranges, in the same (time, id) order
+            models.Index(fields=['customer', '-time', '-id'], name='core_order_customer_time_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with _write_transaction(self, kwargs):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so rollups can move amounts between buckets
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return f'Order {self.pk} - {self.item} for {self.customer}'
+
+
+class CustomerOrderDay(models.Model):
+    """Per-customer, per-day order totals kept current by core.rollups."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='order_days')
+    day = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    last_order_time = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'day'], name='core_customer_order_day_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.customer_id} {self.day}: {self.order_count} order(s), {self.total_amount}'
+
+class SMSNotification(models.Model):
+    """Outbox row for an SMS that still has to be handed to the gateway."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+    to_number = models.CharField(max_length=20)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_sms_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'SMS {self.pk} to {self.to_number} ({self.status})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied ``Idempotency-Key`` and the response it produced.
+    ``status_code`` is null while the first request is still running.
+    """
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='core_idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope} {self.key} ({self.status_code or "in progress"})'
+
+
+class ChangeLogEntry(models.Model):
+    """
+    One insert, update or delete of an Order or Customer, written in the
+    same transaction as the change. ``seq`` is assigned after commit by
+    core.changes.assign_sequence, so it follows commit order.
+    """
+    OP_INSERT = 'insert'
+    OP_UPDATE = 'update'
+    OP_DELETE = 'delete'
+    OP_CHOICES = [
+        (OP_INSERT, 'Insert'),
+        (OP_UPDATE, 'Update'),
+        (OP_DELETE, 'Delete'),
+    ]
+
+    seq = models.BigIntegerField(null=True, blank=True, unique=True)
+    table = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    # Row as it was after the change; null for deletes
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Keeps finding rows still waiting for a seq cheap
+            models.Index(fields=['id'], condition=models.Q(seq__isnull=True), name='core_change_unsequenced_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq or "-"} {self.op} {self.table} {self.object_id}'
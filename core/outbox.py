@@ -0,0 +1,189 @@
+"""
+Transactional SMS outbox.
+
+Views enqueue notifications in the same transaction as the rows they describe;
+the ``dispatch_sms`` management command drains the queue in the background.
+"""
+import logging
+from collections import Counter, defaultdict, deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .async_sms import asend_many
+from .models import SMSNotification
+from .phones import to_e164
+from .utils import SMSBatcher
+
+logger = logging.getLogger(__name__)
+
+
+def order_message(customer, order) -> str:
+    """Text of the confirmation SMS sent when an order is placed."""
+    return (
+        f"Hi {customer.name}, we received your order for "
+        f"{order.item} worth {order.amount}."
+    )
+
+
+def enqueue_sms(to_number: str, message: str, order=None, claim: bool = False):
+    """
+    Queue an SMS for the background dispatcher and return the outbox row.
+    The number is stored in E.164 so duplicates are recognised at dispatch.
+    With ``claim=True`` the row is leased to the caller, which is about to
+    send it itself; the dispatcher only picks it up if the lease runs out.
+    """
+    notification = SMSNotification(order=order, to_number=to_e164(to_number), message=message)
+    if claim:
+        notification.next_attempt_at = lease_expiry()
+    notification.save()
+    return notification
+
+
+def broadcast_recipients(customers):
+    """Distinct E.164 numbers of ``customers`` (a queryset), read from the phone_e164 index."""
+    return list(
+        customers.exclude(phone_e164=None)
+        .order_by("phone_e164")
+        .values_list("phone_e164", flat=True)
+        .distinct()
+    )
+
+
+def enqueue_broadcast(message: str, customers):
+    """
+    Queue ``message`` once per distinct phone among ``customers``, however
+    many customers share it or however their numbers were typed.
+    Returns the number of outbox rows created.
+    """
+    rows = [SMSNotification(to_number=number, message=message) for number in broadcast_recipients(customers)]
+    SMSNotification.objects.bulk_create(rows, batch_size=settings.SMS_OUTBOX_BATCH_SIZE)
+    return len(rows)
+
+
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.SMS_OUTBOX_LEASE_SECONDS)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff for the given number of failed attempts, capped."""
+    base = settings.SMS_OUTBOX_RETRY_BASE_SECONDS
+    cap = settings.SMS_OUTBOX_RETRY_MAX_SECONDS
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def distinct_rounds(batch):
+    """
+    Split notifications into rounds in which no (number, text) pair repeats.
+
+    Bulk sends collapse repeated numbers, so two rows with the same number
+    and text must not share a call. The second copy goes in the second round,
+    and so on. Usually there is a single round.
+    """
+    rounds, seen = [], Counter()
+    for notification in batch:
+        key = (to_e164(notification.to_number), notification.message)
+        if seen[key] == len(rounds):
+            rounds.append([])
+        rounds[seen[key]].append(notification)
+        seen[key] += 1
+    return rounds
+
+
+def dispatch_batch(batch_size: int = None) -> int:
+    """
+    Claim up to ``batch_size`` due notifications and send them, coalescing
+    identical messages to different numbers into bulk gateway calls.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    workers can drain the outbox concurrently without sending twice.
+    Returns the number of rows processed.
+    """
+    batch_size = batch_size or settings.SMS_OUTBOX_BATCH_SIZE
+
+    with transaction.atomic():
+        batch = list(
+            SMSNotification.objects.select_for_update(skip_locked=True)
+            .filter(status=SMSNotification.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        results = []
+        for round_ in distinct_rounds(batch):
+            # Notifications sharing the same text go out in one multi-recipient call
+            batcher = SMSBatcher(flush_interval=float("inf"))
+            for notification in round_:
+                batcher.add(notification.to_number, notification.message)
+            results.extend(batcher.flush())
+        record_results(batch, results)
+    return len(batch)
+
+
+def record_results(batch, results):
+    """
+    Mark each notification sent, or failed / due for retry, from gateway
+    results. Repeated (number, text) pairs take their results in order,
+    one per row, as sent by ``distinct_rounds``.
+    """
+    max_attempts = settings.SMS_OUTBOX_MAX_ATTEMPTS
+    pending = defaultdict(deque)
+    for r in results:
+        pending[(r["number"], r["message"])].append(r)
+
+    for notification in batch:
+        notification.attempts += 1
+        queue = pending.get((to_e164(notification.to_number), notification.message))
+        result = queue.popleft() if queue else None
+        if result and result["success"]:
+            notification.status = SMSNotification.STATUS_SENT
+            notification.sent_at = timezone.now()
+            notification.last_error = ""
+        else:
+            error = (result.get("error") or result["status"]) if result else "no gateway result"
+            notification.last_error = error
+            if notification.attempts >= max_attempts:
+                notification.status = SMSNotification.STATUS_FAILED
+                logger.error("Giving up on SMS %s after %s attempts: %s", notification.pk, notification.attempts, error)
+            else:
+                notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts)
+                logger.warning("SMS %s failed, retrying at %s: %s", notification.pk, notification.next_attempt_at, error)
+        notification.save(update_fields=["attempts", "status", "next_attempt_at", "last_error", "sent_at"])
+
+
+def claim_batch(batch_size: int = None):
+    """
+    Lease up to ``batch_size`` due notifications for an async sender.
+    The lease is pushed into ``next_attempt_at`` and committed, so no
+    transaction stays open while the messages are in flight.
+    """
+    batch_size = batch_size or settings.SMS_OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        batch = list(
+            SMSNotification.objects.select_for_update(skip_locked=True)
+            .filter(status=SMSNotification.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        expiry = lease_expiry()
+        SMSNotification.objects.filter(pk__in=[n.pk for n in batch]).update(next_attempt_at=expiry)
+        for notification in batch:
+            notification.next_attempt_at = expiry
+    return batch
+
+
+async def asend_notifications(batch):
+    """Send already-claimed notifications concurrently and record the outcome."""
+    if not batch:
+        return
+    results = []
+    for round_ in distinct_rounds(batch):
+        results.extend(await asend_many((n.to_number, n.message) for n in round_))
+    await sync_to_async(record_results)(batch, results)
+
+
+async def adispatch_batch(batch_size: int = None) -> int:
+    """Async ``dispatch_batch``: claim, send concurrently, record. Returns rows processed."""
+    batch = await sync_to_async(claim_batch)(batch_size)
+    await asend_notifications(batch)
+    return len(batch)
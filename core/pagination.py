@@ -0,0 +1,107 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on every field of ``ordering``, not just the first.
+
+    DRF's CursorPagination filters on ``ordering[0]`` and breaks ties with an
+    offset capped at ``offset_cutoff``, so more rows than that sharing one
+    value can never be paged past. Here the cursor holds the values of all
+    ordering fields and the next page is found with a row comparison, e.g.
+    ``time < t OR (time = t AND id < i)``. ``ordering`` must be unique, so the
+    cursor never needs an offset.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self.after(queryset.model, position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, model, position, reverse):
+        """``Q`` matching the rows that follow ``position`` in the paging direction."""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            fields = [order.lstrip("-") for order in self.ordering]
+            values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        lookups = ["lt" if order.startswith("-") != reverse else "gt" for order in self.ordering]
+        condition = None
+        for field, value, lookup in reversed(list(zip(fields, values, lookups))):
+            # Past the cursor on this field, or level with it and past it on the next
+            past = Q(**{f"{field}__{lookup}": value})
+            condition = past if condition is None else past | (Q(**{field: value}) & condition)
+        # The redundant bound on the leading field lets the index serve the OR as a range scan
+        return Q(**{f"{fields[0]}__{lookups[0]}e": values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip("-") for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return json.dumps([str(value) for value in values])
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over (time, id), newest first.
+    Backed by the core_order_time_id_idx index, so every page costs the same.
+    """
+    ordering = ("-time", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class CustomerCursorPagination(CursorPagination):
+    """Keyset pagination over the customer primary key."""
+    ordering = ("id",)
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class CustomerStatsCursorPagination(CursorPagination):
+    """Keyset pagination over per-customer rollup rows."""
+    ordering = ("customer",)
+    page_size_query_param = "page_size"
+    max_page_size = 1000
@@ -0,0 +1,163 @@
+"""
+Optional monthly range partitioning of ``core_order`` on ``time`` (PostgreSQL).
+
+With ``ORDERS_PARTITIONED=True`` migration 0010 (or ``manage.py
+manage_partitions --convert`` later on) replaces ``core_order`` with a table
+``PARTITION BY RANGE (time)`` holding one partition per month,
+``core_order_pYYYY_MM``, plus a default partition catching anything outside
+them. ``manage.py manage_partitions`` then keeps future months created ahead
+of time and archives months older than ``ORDERS_PARTITION_RETENTION_MONTHS``:
+each is exported to a gzipped CSV and detached from the table.
+
+Notes on the partitioned layout:
+
+* The primary key becomes ``(id, time)``; ids still come from one sequence,
+  so they stay unique.
+* A foreign key cannot reference a partitioned table without the partition
+  key, so ``core_smsnotification.order_id`` loses its database constraint.
+  ``on_delete=SET_NULL`` is applied by Django and keeps working.
+* Queries with a ``time`` range (order list filters, cursor pages, export
+  ``since``) are pruned to the partitions that can match.
+"""
+import re
+from datetime import date
+
+from django.db import connection as default_connection
+
+from .models import Order
+
+TABLE = Order._meta.db_table
+LEGACY_TABLE = f"{TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name):
+    """Month covered by a partition name, or None for other tables (e.g. the default partition)."""
+    match = PARTITION_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partitions_to_create(today, months_ahead, existing):
+    """Months from the current one to ``months_ahead`` ahead that have no partition yet."""
+    have = {partition_month(name) for name in existing}
+    current = month_start(today)
+    return [m for m in (add_months(current, i) for i in range(months_ahead + 1)) if m not in have]
+
+
+def partitions_to_archive(today, retention_months, existing):
+    """
+    Partitions entirely older than the retention window, oldest first.
+    ``retention_months`` counts whole months kept before the current one;
+    0 or less keeps everything.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today), -retention_months)
+    months = sorted(m for m in map(partition_month, existing) if m is not None and m < cutoff)
+    return [partition_name(m) for m in months]
+
+
+def create_partition_sql(month):
+    start, end = month, add_months(month, 1)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def is_partitioned(connection=default_connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def existing_partitions(connection=default_connection):
+    """Names of the tables currently attached to ``core_order``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [TABLE],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def _has_extension(cursor, name):
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = %s", [name])
+    return cursor.fetchone() is not None
+
+
+def convert_to_partitioned(connection=default_connection, months_ahead=3):
+    """
+    Rebuild ``core_order`` as a partitioned table and copy the rows over.
+    Runs in one transaction and locks the table for the whole copy, so plan
+    a maintenance window for large tables. Returns the number of rows moved.
+    """
+    today = date.today()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(time), count(*) FROM "{TABLE}"')
+        oldest, count = cursor.fetchone()
+        first = month_start(oldest.date()) if oldest else month_start(today)
+
+        # The old id sequence goes away with the old table; free its name first
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        (legacy_sequence,) = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY_TABLE}"')
+        if legacy_sequence:
+            cursor.execute(f"ALTER SEQUENCE {legacy_sequence} RENAME TO {LEGACY_TABLE}_id_seq")
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq AS bigint")
+        cursor.execute(
+            f"SELECT setval('{TABLE}_id_seq', COALESCE((SELECT max(id) FROM \"{LEGACY_TABLE}\"), 0) + 1, false)"
+        )
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" ('
+            f"  id bigint NOT NULL DEFAULT nextval('{TABLE}_id_seq'),"
+            "  item varchar(200) NOT NULL,"
+            "  amount numeric(10, 2) NOT NULL,"
+            "  time timestamp with time zone NOT NULL,"
+            '  customer_id bigint NOT NULL REFERENCES "core_customer" (id) DEFERRABLE INITIALLY DEFERRED,'
+            "  PRIMARY KEY (id, time)"
+            ") PARTITION BY RANGE (time)"
+        )
+        cursor.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY "{TABLE}".id')
+        month = first
+        last = add_months(month_start(today), months_ahead)
+        while month <= last:
+            cursor.execute(create_partition_sql(month))
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(
+            f'INSERT INTO "{TABLE}" (id, item, amount, time, customer_id) '
+            f'SELECT id, item, amount, time, customer_id FROM "{LEGACY_TABLE}"'
+        )
+        # Drops the legacy indexes (freeing their names) and the outbox FK
+        cursor.execute(f'DROP TABLE "{LEGACY_TABLE}" CASCADE')
+
+        # Same names as the model indexes, so later migrations still find them
+        cursor.execute(f'CREATE INDEX core_order_time_id_idx ON "{TABLE}" (time DESC, id DESC)')
+        cursor.execute(
+            f'CREATE INDEX core_order_customer_time_idx ON "{TABLE}" (customer_id, time DESC, id DESC)'
+        )
+        cursor.execute(f'CREATE INDEX core_order_item_prefix_idx ON "{TABLE}" (item varchar_pattern_ops)')
+        if _has_extension(cursor, "pg_trgm"):
+            cursor.execute(f'CREATE INDEX core_order_item_trgm_idx ON "{TABLE}" USING gin (UPPER(item) gin_trgm_ops)')
+    return count
@@ -0,0 +1,46 @@
+"""
+Phone number normalization to E.164 (``+<country code><number>``).
+
+Numbers arrive as ``+254 700-000-000``, ``0700000000``, ``00254700000000``
+or ``254700000000`` for the same phone. ``normalize_phone`` maps all of them
+to ``+254700000000``; it is stored in ``Customer.phone_e164`` (indexed) and
+used wherever recipients are compared, so one phone gets one message.
+"""
+import re
+
+from django.conf import settings
+
+# Separators people type into phone numbers
+_SEPARATORS = re.compile(r"[\s().-]")
+# E.164: a country code not starting with 0, at most 15 digits in total
+_E164_DIGITS = re.compile(r"^[1-9][0-9]{6,14}$")
+
+
+def normalize_phone(number, country_code=None):
+    """
+    E.164 form of ``number``, or None if it cannot be one. A single leading
+    ``0`` is a national trunk prefix and is replaced by ``country_code``
+    (``PHONE_DEFAULT_COUNTRY_CODE`` by default); bare digits are taken to
+    already include a country code.
+    """
+    if not number:
+        return None
+    digits = _SEPARATORS.sub("", str(number))
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = (country_code or settings.PHONE_DEFAULT_COUNTRY_CODE) + digits[1:]
+    if not _E164_DIGITS.match(digits):
+        return None
+    return f"+{digits}"
+
+
+def to_e164(number: str) -> str:
+    """``normalize_phone``, falling back to a ``+``-prefixed copy so the gateway can reject it."""
+    normalized = normalize_phone(number)
+    if normalized is not None:
+        return normalized
+    number = number.strip()
+    return number if number.startswith("+") else f"+{number}"
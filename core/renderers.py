@@ -0,0 +1,141 @@
+"""
+Response renderers.
+
+``FastJSONRenderer`` is the default JSON renderer: orjson, with values orjson
+cannot encode natively (Decimal, lazy strings, datetimes) handed to DRF's
+encoder, so the output matches ``JSONRenderer``. ``MessagePackRenderer`` and
+``ArrowRenderer`` are opt-in through ``Accept`` and only registered when
+``msgpack`` / ``pyarrow`` are installed (see REST_FRAMEWORK in settings).
+pyarrow is imported on first use; it would add ~65ms to every cold start.
+"""
+import csv
+import io
+import json
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # optional: application/msgpack
+    msgpack = None
+
+_encoder = JSONEncoder()
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def encode_default(obj):
+    """What DRF's JSONEncoder makes of a value; shared by the binary renderers."""
+    return _encoder.default(obj)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a list as newline-delimited JSON, anything else as a single line."""
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return "".join(json.dumps(row, cls=JSONEncoder) + "\n" for row in rows).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a list of flat dicts (or a single dict) as CSV with a header row."""
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not data:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` output, encoded by orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        # orjson cannot indent arbitrarily; ?indent / Accept: ...; indent=4 keep the stdlib path
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these two so the output is also valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack (``Accept: application/msgpack``); same structure as the JSON output."""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class ArrowRenderer(BaseRenderer):
+    """
+    Columnar Arrow IPC stream (``Accept: application/vnd.apache.arrow.stream``)
+    for list endpoints: one row per result, one column per field. Pagination
+    links go into the schema metadata (``next``, ``previous``). A view can
+    declare ``arrow_types`` (field -> callable taking the pyarrow module and
+    returning a type) so decimal strings and ISO timestamps arrive as real
+    decimal and timestamp columns; other columns are inferred.
+    """
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import pyarrow
+        import pyarrow.ipc
+
+        if data is None:
+            return b""
+        metadata = {}
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            metadata = {key: data[key] or "" for key in ("next", "previous") if key in data}
+            rows = data["results"]
+        else:
+            rows = data if isinstance(data, list) else [data]
+        if rows and not isinstance(rows[0], dict):
+            rows = [{"value": value} for value in rows]
+
+        view = (renderer_context or {}).get("view")
+        types = getattr(view, "arrow_types", {})
+        columns = list(rows[0]) if rows else list(types)
+        arrays, fields = [], []
+        for name in columns:
+            array = pyarrow.array([row.get(name) for row in rows])
+            if name in types:
+                # Arrow parses the decimal strings and ISO 8601 timestamps itself, in C++
+                array = array.cast(types[name](pyarrow))
+            arrays.append(array)
+            fields.append(pyarrow.field(name, array.type))
+        table = pyarrow.Table.from_arrays(arrays, schema=pyarrow.schema(fields, metadata=metadata))
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
@@ -0,0 +1,194 @@
+"""
+Read replicas (``DB_REPLICA_URLS``).
+
+Only the list and retrieve actions of the API viewsets read from a replica
+(``ReplicaReadsMixin``), and only for the API tables in
+``ReplicaRouter.replica_models``. Everything else uses the primary: writes,
+sessions and users, the change feed, idempotency keys, the outbox and all
+management commands. One healthy replica is picked per request, round-robin.
+
+Replicas are checked at most every ``REPLICA_CHECK_INTERVAL`` seconds, in
+whichever request asks first. A replica that cannot be reached, or that
+replays more than ``REPLICA_MAX_LAG`` seconds behind the primary, gets no
+reads until a later check passes. With no healthy replica, reads go to the
+primary.
+
+Read-your-writes: a POST, PUT, PATCH or DELETE pins the client to the primary
+for ``REPLICA_PIN_SECONDS``. The pin is sent as a cookie
+(``REPLICA_PIN_COOKIE``) and as a response header (``REPLICA_PIN_HEADER``),
+and accepted back in either form. Clients without a cookie jar can echo the
+header. An order created by a client is therefore readable by that client
+right away. Other clients can see it up to the replica lag later.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+# Replica alias the current request reads from, or None for the primary
+_read_replica = ContextVar("read_replica", default=None)
+
+_PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (None if unknown); raises DatabaseError if unreachable."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(_PG_LAG_SQL)
+            lag = cursor.fetchone()[0]
+            return None if lag is None else float(lag)
+        cursor.execute("SELECT 1")
+    return 0.0
+
+
+def check_replica(alias):
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError:
+        # Logged, not returned: the status is shown by the public health probe
+        logger.exception("Replica %s check failed", alias)
+        return {"healthy": False, "lag": None}
+    return {"healthy": lag is not None and lag <= settings.REPLICA_MAX_LAG, "lag": lag}
+
+
+class ReplicaHealth:
+    """Per-process view of which replicas may take reads."""
+
+    def __init__(self):
+        self.status = {}
+        self._healthy = ()
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def refresh(self):
+        status = {alias: check_replica(alias) for alias in settings.DATABASE_REPLICAS}
+        for alias, state in status.items():
+            if state["healthy"] != self.status.get(alias, {}).get("healthy", True):
+                logger.warning("Replica %s %s (lag %s)", alias, "is back" if state["healthy"] else "dropped", state["lag"])
+        self.status = status
+        self._healthy = tuple(alias for alias, state in status.items() if state["healthy"])
+        self._checked_at = time.monotonic()
+        return status
+
+    def healthy(self):
+        due = self._checked_at is None or time.monotonic() - self._checked_at >= settings.REPLICA_CHECK_INTERVAL
+        # One thread re-checks; the others keep using the last result meanwhile
+        if due and self._lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def pick(self):
+        healthy = self.healthy() if settings.DATABASE_REPLICAS else ()
+        return healthy[next(self._turn) % len(healthy)] if healthy else None
+
+    def reset(self):
+        """Forget all results (meant for tests)."""
+        self.status, self._healthy, self._checked_at = {}, (), None
+
+
+health = ReplicaHealth()
+
+
+def current_replica():
+    return _read_replica.get()
+
+
+@contextmanager
+def read_from_replica():
+    """Route this block's reads of the replica models to one healthy replica, if any."""
+    token = _read_replica.set(health.pick())
+    try:
+        yield _read_replica.get()
+    finally:
+        _read_replica.reset(token)
+
+
+class ReplicaRouter:
+    replica_models = {"core.customer", "core.order", "core.customerorderday"}
+
+    def db_for_read(self, model, **hints):
+        alias = _read_replica.get()
+        if alias is not None and model._meta.label_lower in self.replica_models:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+def pinned_until(request):
+    """When the client's primary pin expires (epoch seconds; 0 if not pinned)."""
+    until = 0.0
+    for value in (request.COOKIES.get(settings.REPLICA_PIN_COOKIE), request.headers.get(settings.REPLICA_PIN_HEADER)):
+        try:
+            until = max(until, float(value))
+        except (TypeError, ValueError):
+            pass
+    # A client cannot pin itself for longer than one window
+    return min(until, time.time() + settings.REPLICA_PIN_SECONDS)
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """Sets ``request.pinned_to_primary`` and renews the pin after writes."""
+
+    def process_request(self, request):
+        request.pinned_until = pinned_until(request)
+        request.pinned_to_primary = request.pinned_until > time.time()
+
+    def process_response(self, request, response):
+        until = getattr(request, "pinned_until", 0.0)
+        if request.method not in SAFE_METHODS:
+            until = time.time() + settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, f"{until:.3f}", max_age=settings.REPLICA_PIN_SECONDS,
+                secure=request.is_secure(), httponly=True, samesite="Lax",
+            )
+        if until > time.time():
+            response[settings.REPLICA_PIN_HEADER] = f"{until:.3f}"
+        return response
+
+
+class ReplicaReadsMixin:
+    """Viewset mixin: the actions in ``replica_actions`` read from a replica unless the client is pinned."""
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        action = (getattr(self, "action_map", None) or {}).get(request.method.lower())
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and action in self.replica_actions
+            and not getattr(request, "pinned_to_primary", False)
+        ):
+            with read_from_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
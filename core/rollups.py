@@ -0,0 +1,123 @@
+"""
+Per-customer daily order rollups (``CustomerOrderDay``).
+
+New orders are folded in with a single ``INSERT ... ON CONFLICT DO UPDATE``
+that adds to the existing bucket. Updates and deletes recompute the affected
+buckets from ``Order``. They lock the bucket row first, so a concurrent
+increment either is counted by the recompute or waits and lands on top of
+it. ``manage.py rebuild_rollups`` rebuilds everything from scratch.
+"""
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CustomerOrderDay, Order
+
+# Buckets per INSERT statement (5 parameters each)
+UPSERT_BATCH_SIZE = 500
+
+_to_amount = Order._meta.get_field("amount").to_python
+
+
+def order_day(value):
+    """The rollup day an order timestamp falls in (in the project time zone)."""
+    return timezone.localdate(value)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, dt_time.min))
+    return start, start + timedelta(days=1)
+
+
+def record_orders(orders):
+    """Add newly created orders to their (customer, day) buckets."""
+    buckets = defaultdict(lambda: [0, 0, None])
+    for order in orders:
+        bucket = buckets[(order.customer_id, order_day(order.time))]
+        bucket[0] += 1
+        # Assigned values may still be strings or floats ("12.50" is valid input)
+        bucket[1] += _to_amount(order.amount)
+        if bucket[2] is None or order.time > bucket[2]:
+            bucket[2] = order.time
+    if not buckets:
+        return
+
+    items = list(buckets.items())
+    for start in range(0, len(items), UPSERT_BATCH_SIZE):
+        _upsert(items[start:start + UPSERT_BATCH_SIZE])
+
+
+def _upsert(items):
+    ops = connection.ops
+    table = ops.quote_name(CustomerOrderDay._meta.db_table)
+    rows, params = [], []
+    for (customer_id, day), (count, amount, last) in items:
+        rows.append("(%s, %s, %s, %s, %s)")
+        params += [
+            customer_id,
+            ops.adapt_datefield_value(day),
+            count,
+            ops.adapt_decimalfield_value(amount, 16, 2),
+            ops.adapt_datetimefield_value(last),
+        ]
+    sql = (
+        f"INSERT INTO {table} (customer_id, day, order_count, total_amount, last_order_time) "
+        f"VALUES {', '.join(rows)} "
+        f"ON CONFLICT (customer_id, day) DO UPDATE SET "
+        f"order_count = {table}.order_count + excluded.order_count, "
+        f"total_amount = {table}.total_amount + excluded.total_amount, "
+        f"last_order_time = CASE WHEN excluded.last_order_time > {table}.last_order_time "
+        f"THEN excluded.last_order_time ELSE {table}.last_order_time END"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def refresh_bucket(customer_id, day):
+    """Recompute one (customer, day) bucket from the orders table, under the bucket's row lock."""
+    start, end = day_bounds(day)
+    bucket = CustomerOrderDay.objects.filter(customer_id=customer_id, day=day)
+    with transaction.atomic(savepoint=False):
+        # Make sure there is a row to lock; it is updated or deleted below
+        CustomerOrderDay.objects.bulk_create(
+            [CustomerOrderDay(customer_id=customer_id, day=day, order_count=0, total_amount=0, last_order_time=start)],
+            ignore_conflicts=True,
+        )
+        list(bucket.select_for_update().values_list("pk", flat=True))
+        totals = Order.objects.filter(customer_id=customer_id, time__gte=start, time__lt=end).aggregate(
+            order_count=Count("id"), total_amount=Sum("amount"), last_order_time=Max("time")
+        )
+        if not totals["order_count"]:
+            bucket.delete()
+            return
+        bucket.update(**totals)
+
+
+def rebuild(customer_ids=None, batch_size=1000):
+    """Drop and recompute all buckets (or those of ``customer_ids``). Returns the bucket count."""
+    buckets = CustomerOrderDay.objects.all()
+    orders = Order.objects.all()
+    if customer_ids is not None:
+        buckets = buckets.filter(customer_id__in=customer_ids)
+        orders = orders.filter(customer_id__in=customer_ids)
+    buckets.delete()
+
+    rows = (
+        orders.annotate(day=TruncDate("time"))
+        .values("customer_id", "day")
+        .annotate(order_count=Count("id"), total_amount=Sum("amount"), last_order_time=Max("time"))
+        .order_by()
+    )
+    created = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(CustomerOrderDay(**row))
+        if len(batch) >= batch_size:
+            created += len(CustomerOrderDay.objects.bulk_create(batch))
+            batch = []
+    created += len(CustomerOrderDay.objects.bulk_create(batch))
+    return created
@@ -1,18 +1,159 @@
+from django.utils import timezone
 from rest_framework import serializers
+from .cache import customer_cache
+from .metrics import timed
 from .models import Customer, Order
 
-class CustomerSerializer(serializers.ModelSerializer):
+
+def decimal_repr(value, places=2):
+    """Same output as DecimalField(decimal_places=places).to_representation."""
+    return None if value is None else f"{value:.{places}f}"
+
+
+def datetime_repr(value):
+    """Same output as DateTimeField().to_representation for aware datetimes."""
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for list endpoints: builds response dicts straight
+    from ``.values()`` rows instead of running every ModelSerializer field.
+    Subclasses list ``(output name, values() lookup, converter or None)``.
+    """
+    fields = ()
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*(lookup for _, lookup, _ in cls.fields))
+
+    @property
+    @timed("serializer")
+    def data(self):
+        fields = self.fields
+        return [
+            {name: convert(row[lookup]) if convert else row[lookup] for name, lookup, convert in fields}
+            for row in self.rows
+        ]
+
+class TimedListSerializer(serializers.ListSerializer):
+    """``many=True`` counterpart of TimedSerializerMixin."""
+
+    @timed("serializer")
+    def is_valid(self, *args, **kwargs):
+        return super().is_valid(*args, **kwargs)
+
+    @property
+    @timed("serializer")
+    def data(self):
+        return super().data
+
+
+class TimedSerializerMixin:
+    """Counts validation and representation time as the request's serializer time."""
+
+    @timed("serializer")
+    def is_valid(self, *args, **kwargs):
+        return super().is_valid(*args, **kwargs)
+
+    @property
+    @timed("serializer")
+    def data(self):
+        return super().data
+
+
+class CustomerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
+        list_serializer_class = TimedListSerializer
         fields = ["id", "name", "code", "phone_number"]
 
-class OrderSerializer(serializers.ModelSerializer):
+class CustomerValuesSerializer(ValuesSerializer):
+    fields = (
+        ("id", "id", None),
+        ("name", "name", None),
+        ("code", "code", None),
+        ("phone_number", "phone_number", None),
+    )
+
+
+class CachedCustomerField(serializers.PrimaryKeyRelatedField):
+    """Customer primary key field that resolves through the customer cache."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        customer = customer_cache.get(pk)
+        if customer is None:
+            self.fail("does_not_exist", pk_value=data)
+        return customer
+
+
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    customer = CachedCustomerField(queryset=Customer.objects.all())
+
     class Meta:
         model = Order
         fields = ["id", "customer", "item", "amount", "time"]
         read_only_fields = ["time"]
+        list_serializer_class = TimedListSerializer
 
     def validate_amount(self, value):
         if value < 0:
             raise serializers.ValidationError("Amount must be non-negative.")
         return value
+
+
+class OrderExpandedSerializer(OrderSerializer):
+    """Order with its customer embedded (``?expand=customer``)."""
+    customer = CustomerSerializer(read_only=True)
+
+
+class OrderValuesSerializer(ValuesSerializer):
+    fields = (
+        ("id", "id", None),
+        ("customer", "customer", None),
+        ("item", "item", None),
+        ("amount", "amount", decimal_repr),
+        ("time", "time", datetime_repr),
+    )
+
+
+class OrderBulkSerializer(OrderSerializer):
+    """
+    Validates one row of a bulk upload with the OrderSerializer rules.
+    The customer is given by id or by code and resolved by the caller.
+    """
+    customer = serializers.IntegerField(required=False, min_value=1)
+    customer_code = serializers.CharField(required=False, max_length=50)
+
+    class Meta(OrderSerializer.Meta):
+        fields = ["customer", "customer_code", "item", "amount"]
+
+    def validate(self, attrs):
+        if "customer" not in attrs and "customer_code" not in attrs:
+            raise serializers.ValidationError("Provide customer or customer_code.")
+        return attrs
+
+
+class CustomerStatsSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Order totals for one customer, read from the CustomerOrderDay rollup."""
+    customer = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+    total_amount = serializers.DecimalField(max_digits=16, decimal_places=2)
+    last_order_time = serializers.DateTimeField(allow_null=True)
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
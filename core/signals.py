@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import changes, rollups
+from .cache import bump_table_version, customer_cache
+from .models import ChangeLogEntry, Customer, Order
+
+
+def _loaded_bucket(order):
+    """The (customer, day) bucket an order was in when it was read from the database."""
+    loaded = getattr(order, "_loaded_values", None)
+    if loaded is None:
+        return None
+    return loaded["customer_id"], rollups.order_day(loaded["time"])
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_bucket(sender, instance, **kwargs):
+    # Orders built in memory (not loaded) still need their previous bucket on update
+    if instance.pk is not None and getattr(instance, "_loaded_values", None) is None:
+        loaded = Order.objects.filter(pk=instance.pk).values("customer_id", "time").first()
+        if loaded:
+            instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and getattr(instance, "_loaded_values", None) is None:
+        rollups.record_orders([instance])
+    else:
+        buckets = {(instance.customer_id, rollups.order_day(instance.time)), _loaded_bucket(instance)}
+        for bucket in buckets - {None}:
+            rollups.refresh_bucket(*bucket)
+    instance._loaded_values = {"customer_id": instance.customer_id, "time": instance.time}
+
+
+@receiver(post_delete, sender=Order)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    bucket = _loaded_bucket(instance) or (instance.customer_id, rollups.order_day(instance.time))
+    rollups.refresh_bucket(*bucket)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer_cache(sender, instance, **kwargs):
+    customer_cache.invalidate(instance)
+    # Again after commit, in case a reader re-cached the old row in between
+    transaction.on_commit(lambda: customer_cache.invalidate(instance))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_list_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    table = sender._meta.model_name
+    bump_table_version(table)
+    # Again after commit so a list cached from pre-commit data is not reused
+    transaction.on_commit(lambda: bump_table_version(table))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Order)
+def log_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    changes.record_change(instance, ChangeLogEntry.OP_INSERT if created else ChangeLogEntry.OP_UPDATE)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Order)
+def log_delete(sender, instance, **kwargs):
+    changes.record_change(instance, ChangeLogEntry.OP_DELETE)
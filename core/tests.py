@@ -1,14 +1,60 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient, APIRequestFactory
 from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from importlib.util import find_spec
+from unittest import skipUnless
 from unittest.mock import patch
-from .models import Customer, Order
-from .utils import send_sms
+from django.db import OperationalError, connection, connections, transaction
+from django.test import override_settings
+from .cache import customer_cache
+from .checks import check_list_cache
+from .bench import baseline as bench_baseline, data as bench_data, encoding as bench_encoding, startup as bench_startup
+from .bench.scenarios import default_scenarios, make_clients, run_all
+from .authentication import CachingCertsRequest, GoogleOIDCAuthentication, certs_request, token_cache
+from . import partitions
+from .customer_import import upsert_customers
+from .export import export_lines
+from .filters import filter_orders
+from .metrics import fold_stack, registry as metrics_registry, timed
+from .idempotency import claim
+from .models import ChangeLogEntry, Customer, CustomerOrderDay, IdempotencyKey, Order, SMSNotification
+from . import async_sms
+from .async_sms import aclose, asend_bulk_sms, asend_many
+from .outbox import adispatch_batch, dispatch_batch, enqueue_broadcast, enqueue_sms
+from .phones import normalize_phone
+from . import replicas
+from .renderers import FastJSONRenderer, msgpack
+from .serializers import CustomerSerializer, OrderSerializer
+from .throttling import CacheBucketStore, LocalBucketStore, parse_rate, reset_throttles
+from . import utils
+from .utils import SMSBatcher, get_sms_client, send_bulk_sms, send_sms
 
 
+# The suite runs in one process, where the locmem list counters are coherent
+@override_settings(LIST_CACHE_ALLOW_LOCAL=True)
 class BaseAPITestCase(APITestCase):
     def setUp(self):
+        customer_cache.clear()
+        reset_throttles()
         # Create and login a superuser for authentication
         self.user = User.objects.create_superuser(
             username="admin", email="admin@example.com", password="adminpass"
@@ -34,12 +80,131 @@ class CustomerAPITests(BaseAPITestCase):
         url = reverse("customer-list")
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data["results"]), 1)
+
+
+class CustomerCacheTests(BaseAPITestCase):
+    def test_retrieve_is_cached_and_invalidated_on_save(self):
+        url = reverse("customer-detail", args=[self.customer.id])
+        self.client.get(url)
+        # Session + user only; the customer comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data["name"], "Test Customer")
+
+        self.customer.name = "Renamed"
+        self.customer.save()
+        self.assertEqual(self.client.get(url).data["name"], "Renamed")
+
+    def test_conditional_get_returns_304(self):
+        url = reverse("customer-detail", args=[self.customer.id])
+        response = self.client.get(url)
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {"name": "Changed"}, format="json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_missing_customer(self):
+        response = self.client.get(reverse("customer-detail", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lookup_by_code_and_delete(self):
+        self.assertEqual(customer_cache.get_by_code("C001").pk, self.customer.pk)
+        with self.assertNumQueries(0):
+            customer_cache.get_by_code("C001")
+        self.customer.delete()
+        self.assertIsNone(customer_cache.get_by_code("C001"))
+
+    def test_order_create_resolves_customer_from_cache(self):
+        customer_cache.get(self.customer.id)
+        response = self.client.post(
+            reverse("order-list"), {"customer": self.customer.id, "item": "X", "amount": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(
+            reverse("order-list"), {"customer": 999, "item": "X", "amount": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StaleCustomerCacheTests(APITransactionTestCase):
+    # Foreign keys are checked at commit, so this needs real transactions
+    def setUp(self):
+        customer_cache.clear()
+        reset_throttles()
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name="Gone", phone_number="+254700000000", code="C001")
+
+    def test_order_for_customer_deleted_in_another_worker_is_rejected(self):
+        self.assertIsNotNone(customer_cache.get(self.customer.pk))
+        # Another worker deletes it; its invalidation never reaches this process
+        with patch.object(customer_cache, "invalidate"):
+            Customer.objects.filter(pk=self.customer.pk).delete()
+        data = {"customer": self.customer.pk, "item": "Laptop", "amount": "1.00"}
+        response = self.client.post(reverse("order-list"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("customer", response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertIsNone(customer_cache.get(self.customer.pk))
+
+
+class ListCachingTests(BaseAPITestCase):
+    def test_list_etag_short_circuits_until_a_write(self):
+        url = reverse("order-list")
+        Order.objects.create(customer=self.customer, item="A", amount=1)
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        # Session + user; no list query
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Order.objects.create(customer=self.customer, item="B", amount=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_full_response_cached_per_query_string(self):
+        url = reverse("customer-list")
+        first = self.client.get(url)
+        with self.assertNumQueries(2):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, first.data)
+        # A different query string is a different cache entry
+        response = self.client.get(url, {"page_size": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+
+    @override_settings(LIST_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_counters_disable_etags(self):
+        Order.objects.create(customer=self.customer, item="A", amount=1)
+        response = self.client.get(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+        self.assertEqual([e.id for e in check_list_cache(None)], ["core.W001"])
+        with override_settings(LIST_CACHE_ALLOW_LOCAL=True):
+            self.assertEqual(check_list_cache(None), [])
+
+    def test_customer_change_invalidates_order_list(self):
+        Order.objects.create(customer=self.customer, item="A", amount=1)
+        etag = self.client.get(reverse("order-list"), {"expand": "customer"})["ETag"]
+        self.customer.name = "Renamed"
+        self.customer.save()
+        response = self.client.get(reverse("order-list"), {"expand": "customer"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["customer"]["name"], "Renamed")
 
 
 class OrderAPITests(BaseAPITestCase):
-    @patch("core.views.send_sms")  # Mock the send_sms used in views
-    def test_create_order_sends_sms(self, mock_send_sms):
+    @patch("core.utils.sms")
+    def test_create_order_queues_sms(self, mock_sms):
         url = reverse("order-list")
         data = {
             "customer": self.customer.id,
@@ -50,8 +215,14 @@ class OrderAPITests(BaseAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Order.objects.count(), 1)
 
+        # The request only writes the outbox row; nothing is sent inline
+        mock_sms.send.assert_not_called()
+        notification = SMSNotification.objects.get()
         expected_message = f"Hi {self.customer.name}, we received your order for {data['item']} worth {data['amount']:.2f}."
-        mock_send_sms.assert_called_once_with(self.customer.phone_number, expected_message)
+        self.assertEqual(notification.order_id, response.data["id"])
+        self.assertEqual(notification.to_number, self.customer.phone_number)
+        self.assertEqual(notification.message, expected_message)
+        self.assertEqual(notification.status, SMSNotification.STATUS_PENDING)
 
     def test_create_order_with_negative_amount(self):
         url = reverse("order-list")
@@ -69,7 +240,747 @@ class OrderAPITests(BaseAPITestCase):
         url = reverse("order-list")
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data["results"]), 1)
+
+    def test_list_orders_cursor_pagination(self):
+        orders = [Order.objects.create(customer=self.customer, item=f"Item {i}", amount=i) for i in range(5)]
+        url = reverse("order-list")
+        seen = []
+        response = self.client.get(url, {"page_size": 2}, format="json")
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"], format="json")
+        # Newest first, every order exactly once
+        self.assertEqual(seen, [o.id for o in reversed(orders)])
+
+    def test_cursor_pages_past_orders_sharing_a_time(self):
+        # More rows on one timestamp than DRF's offset_cutoff (1000)
+        Order.objects.bulk_create(Order(customer=self.customer, item=f"Item {i}", amount=i) for i in range(1500))
+        Order.objects.update(time=timezone.now())
+        url = reverse("order-list")
+        pages = []
+        response = self.client.get(url, {"page_size": 200})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([row["id"] for row in response.data["results"]])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        seen = [pk for page in pages for pk in page]
+        self.assertEqual(len(pages), 8)
+        self.assertEqual(seen, sorted(Order.objects.values_list("id", flat=True), reverse=True))
+        # Walking back from the last page returns the page before it
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([row["id"] for row in response.data["results"]], pages[-2])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("order-list"), {"cursor": "cD1ub3QtanNvbg=="})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IdempotencyTests(BaseAPITestCase):
+    def post_order(self, key, item="Laptop", **extra):
+        data = {"customer": self.customer.id, "item": item, "amount": "1500.00"}
+        return self.client.post(reverse("order-list"), data, format="json", HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+    def test_retry_replays_stored_response(self):
+        first = self.post_order("key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(3):
+            retry = self.post_order("key-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(SMSNotification.objects.count(), 1)
+
+    def test_key_reused_with_different_payload(self):
+        self.post_order("key-1")
+        response = self.post_order("key-1", item="Phone")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.post_order("key-1")
+        User.objects.create_user("other", password="pw")
+        self.client.login(username="other", password="pw")
+        self.assertEqual(self.post_order("key-1").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_in_progress_duplicate_gets_conflict(self):
+        fingerprint = "0" * 64
+        claim(f"orders:{self.user.pk}", "key-1", fingerprint)
+        with patch("core.idempotency.request_hash", return_value=fingerprint):
+            response = self.post_order("key-1")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(Order.objects.exists())
+
+    def test_abandoned_and_expired_keys_are_taken_over(self):
+        row, _ = claim(f"orders:{self.user.pk}", "key-1", "0" * 64)
+        IdempotencyKey.objects.filter(pk=row.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.post_order("key-1").status_code, status.HTTP_201_CREATED)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post_order("key-1", item="Phone")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_request_releases_key(self):
+        response = self.client.post(
+            reverse("order-list"), {"customer": self.customer.id, "item": "Bad", "amount": -1},
+            format="json", HTTP_IDEMPOTENCY_KEY="key-1",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_command_removes_expired_keys(self):
+        self.post_order("key-1")
+        self.post_order("key-2", item="Phone")
+        IdempotencyKey.objects.filter(key="key-1").update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["key-2"])
+
+
+class ListQueryCountTests(BaseAPITestCase):
+    def create_orders(self, count):
+        for i in range(count):
+            customer = Customer.objects.create(name=f"N{i}", code=f"N{i}-{Order.objects.count()}")
+            Order.objects.create(customer=customer, item=f"Item {i}", amount=i)
+
+    def test_order_list_query_count_is_constant(self):
+        url = reverse("order-list")
+        for params in ({}, {"expand": "customer"}):
+            self.create_orders(2)
+            # Session + user + one page query, however many rows
+            with self.assertNumQueries(3):
+                small = self.client.get(url, params)
+            self.create_orders(10)
+            with self.assertNumQueries(3):
+                large = self.client.get(url, params)
+            self.assertGreater(len(large.data["results"]), len(small.data["results"]))
+
+    def test_fast_list_matches_model_serializer(self):
+        self.create_orders(3)
+        response = self.client.get(reverse("order-list"))
+        expected = OrderSerializer(Order.objects.order_by("-time", "-id"), many=True).data
+        self.assertEqual(response.data["results"], [dict(row) for row in expected])
+
+        response = self.client.get(reverse("customer-list"))
+        expected = CustomerSerializer(Customer.objects.order_by("id"), many=True).data
+        self.assertEqual(response.data["results"], [dict(row) for row in expected])
+
+    def test_expand_customer(self):
+        order = Order.objects.create(customer=self.customer, item="X", amount=1)
+        response = self.client.get(reverse("order-detail", args=[order.id]), {"expand": "customer"})
+        self.assertEqual(response.data["customer"]["code"], self.customer.code)
+
+
+class PartitionTests(APITestCase):
+    def test_month_arithmetic_and_names(self):
+        self.assertEqual(partitions.add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partitions.partition_name(date(2025, 3, 1)), "core_order_p2025_03")
+        self.assertEqual(partitions.partition_month("core_order_p2025_03"), date(2025, 3, 1))
+        self.assertIsNone(partitions.partition_month("core_order_default"))
+
+    def test_partitions_to_create_skips_existing(self):
+        existing = ["core_order_p2025_10", "core_order_default"]
+        months = partitions.partitions_to_create(date(2025, 10, 17), 2, existing)
+        self.assertEqual(months, [date(2025, 11, 1), date(2025, 12, 1)])
+        self.assertIn(
+            "FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')", partitions.create_partition_sql(date(2025, 12, 1))
+        )
+
+    def test_partitions_to_archive_respects_retention(self):
+        existing = [partitions.partition_name(date(2025, m, 1)) for m in range(1, 11)] + ["core_order_default"]
+        self.assertEqual(partitions.partitions_to_archive(date(2025, 10, 17), 0, existing), [])
+        self.assertEqual(
+            partitions.partitions_to_archive(date(2025, 10, 17), 6, existing),
+            ["core_order_p2025_01", "core_order_p2025_02", "core_order_p2025_03"],
+        )
+
+    @skipUnless(connection.vendor != "postgresql", "checks the non-PostgreSQL guard")
+    def test_command_requires_postgres(self):
+        self.assertFalse(partitions.is_partitioned())
+        with self.assertRaises(CommandError):
+            call_command("manage_partitions", stdout=StringIO())
+
+    def test_export_until_bounds_the_range(self):
+        customer = Customer.objects.create(name="A", code="A1")
+        order = Order.objects.create(customer=customer, item="X", amount=1)
+        lines = list(export_lines("csv", until=order.time))
+        self.assertEqual(len(lines), 1)
+        lines = list(export_lines("csv", since=order.time, until=order.time + timedelta(seconds=1)))
+        self.assertEqual(len(lines), 2)
+
+
+class OrderFilterTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Customer.objects.create(name="Other", phone_number="+254711111111", code="C002")
+        self.orders = [
+            Order.objects.create(customer=self.customer, item="Laptop Pro", amount=1500),
+            Order.objects.create(customer=self.customer, item="Phone case", amount=20),
+            Order.objects.create(customer=self.other, item="Laptop bag", amount=80),
+        ]
+        # Spread the orders over three days
+        for days_ago, order in zip((2, 1, 0), self.orders):
+            Order.objects.filter(pk=order.pk).update(time=timezone.now() - timedelta(days=days_ago))
+
+    def ids(self, **params):
+        response = self.client.get(reverse("order-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return sorted(row["id"] for row in response.data["results"])
+
+    def test_filters(self):
+        first, second, third = (o.id for o in self.orders)
+        self.assertEqual(self.ids(customer=self.customer.id), [first, second])
+        self.assertEqual(self.ids(customer_code="C002"), [third])
+        self.assertEqual(self.ids(customer_code="missing"), [])
+        self.assertEqual(self.ids(customer=self.customer.id, customer_code="C002"), [])
+        self.assertEqual(self.ids(amount__gte="50", amount__lte="100"), [third])
+        self.assertEqual(self.ids(item="Laptop"), [first, third])
+        self.assertEqual(self.ids(search="CASE"), [second])
+
+    def test_time_range_dates_cover_whole_days(self):
+        today = timezone.localdate()
+        yesterday = (today - timedelta(days=1)).isoformat()
+        self.assertEqual(self.ids(time__gte=yesterday, time__lte=yesterday), [self.orders[1].id])
+        self.assertEqual(self.ids(time__gte=today.isoformat()), [self.orders[2].id])
+        until = (timezone.now() - timedelta(hours=12)).isoformat()
+        self.assertEqual(self.ids(time__lte=until), [self.orders[0].id, self.orders[1].id])
+
+    def test_invalid_values_are_rejected(self):
+        response = self.client.get(reverse("order-list"), {"customer": "x", "amount__gte": "NaN", "time__gte": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {"customer", "amount__gte", "time__gte"})
+
+    def test_out_of_range_customer_is_rejected(self):
+        for value in ("99999999999999999999999", str(-2 ** 63 - 1)):
+            response = self.client.get(reverse("order-list"), {"customer": value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(set(response.data), {"customer"})
+        self.assertEqual(self.ids(customer=str(2 ** 63 - 1)), [])
+
+    def test_unknown_customer_code_still_validates_other_params(self):
+        response = self.client.get(reverse("order-list"), {"customer_code": "missing", "amount__gte": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {"amount__gte"})
+
+    def test_filters_combine_with_cursor_pagination(self):
+        url = reverse("order-list")
+        response = self.client.get(url, {"customer": self.customer.id, "page_size": 1})
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.orders[1].id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.orders[0].id])
+
+    def explain(self, queryset):
+        if connection.vendor == "postgresql":
+            # Tiny test tables would otherwise be scanned sequentially
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_customer_time_range_uses_composite_index(self):
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Seed {i}", code=f"S{i}") for i in range(20)
+        )
+        Order.objects.bulk_create(
+            Order(customer=customers[i % 20], item=f"Item {i}", amount=i) for i in range(2000)
+        )
+        queryset = filter_orders(
+            Order.objects.order_by("-time", "-id"),
+            {"customer": str(customers[3].pk), "time__gte": "2020-01-01"},
+        )[:100]
+        self.assertIn("core_order_customer_time_idx", self.explain(queryset))
+
+    @skipUnless(connection.vendor == "postgresql", "pg_trgm and varchar_pattern_ops are PostgreSQL features")
+    def test_item_filters_use_postgres_indexes(self):
+        base = Order.objects.order_by("-time", "-id")
+        self.assertIn("core_order_item_prefix_idx", self.explain(filter_orders(base, {"item": "Lap"})))
+        self.assertIn("core_order_item_trgm_idx", self.explain(filter_orders(base, {"search": "top"})))
+
+
+class BulkOrderAPITests(BaseAPITestCase):
+    def test_bulk_create_json_array_with_row_errors(self):
+        Customer.objects.create(name="No Phone", code="C002")
+        rows = [
+            {"customer": self.customer.id, "item": "A", "amount": "10.00"},
+            {"customer_code": "C002", "item": "B", "amount": 20},
+            {"customer": self.customer.id, "item": "C", "amount": -1},
+            {"customer_code": "MISSING", "item": "D", "amount": 5},
+            {"item": "E", "amount": 5},
+        ]
+        url = reverse("order-bulk")
+        # Session + user, one customer lookup, one INSERT per table incl. the change log (plus savepoint)
+        with self.assertNumQueries(9):
+            response = self.client.post(url, rows, format="json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["failed"], 3)
+        results = response.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(Order.objects.get(pk=results[1]["id"]).customer.code, "C002")
+        self.assertIn("amount", results[2]["errors"])
+        self.assertIn("customer_code", results[3]["errors"])
+        self.assertIn("non_field_errors", results[4]["errors"])
+        # Only the customer with a phone number gets an SMS queued
+        self.assertEqual(SMSNotification.objects.get().order_id, results[0]["id"])
+
+    def test_bulk_create_ndjson(self):
+        body = "\n".join(
+            f'{{"customer": {self.customer.id}, "item": "Item {i}", "amount": {i}}}' for i in range(3)
+        )
+        response = self.client.post(reverse("order-bulk"), body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_bulk_rejects_non_list(self):
+        response = self.client.post(reverse("order-bulk"), {"item": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_batch_can_be_paged_through(self):
+        # COPY on PostgreSQL with psycopg 3, bulk_create elsewhere
+        rows = [{"customer": self.customer.id, "item": f"Item {i}", "amount": 1} for i in range(1500)]
+        response = self.client.post(reverse("order-bulk"), rows, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        created = sorted(r["id"] for r in response.data["results"])
+        # Rows carry their own insert time rather than one shared stamp
+        self.assertGreater(Order.objects.values("time").distinct().count(), 1)
+        seen = []
+        response = self.client.get(reverse("order-list"), {"page_size": 1000})
+        while True:
+            seen.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(sorted(seen), created)
+
+
+class CustomerUpsertTests(BaseAPITestCase):
+    url = "/api/customers/bulk-upsert/"
+
+    def test_csv_upsert_creates_updates_and_rejects(self):
+        customer_cache.get(self.customer.pk)
+        body = (
+            "code,name,email,phone_number\n"
+            "C001,Renamed,renamed@example.com,+254 711-111-111\n"
+            "C002,New Customer,,\n"
+            ",No Code,,\n"
+            "C003,Bad Contact,not-an-email,12ab\n"
+            '"C004","Quoted, Name",x@example.com,0722000000\n'
+        )
+        response = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["rejected"], 2)
+        self.assertEqual([e["row"] for e in response.data["errors"]], [3, 4])
+        self.assertIn("code", response.data["errors"][0]["errors"])
+        self.assertEqual(set(response.data["errors"][1]["errors"]), {"email", "phone_number"})
+
+        # bulk_create skips signals; the cached copy must still be dropped
+        renamed = customer_cache.get(self.customer.pk)
+        self.assertEqual(renamed.name, "Renamed")
+        self.assertEqual(renamed.phone_number, "+254711111111")
+        self.assertEqual(Customer.objects.get(code="C004").name, "Quoted, Name")
+        self.assertIsNone(Customer.objects.get(code="C002").email)
+
+    def test_ndjson_chunks_and_repeated_codes(self):
+        lines = [json.dumps({"code": f"N{i % 3}", "name": f"Name {i}"}) for i in range(7)]
+        lines.insert(2, "{not json")
+        result = upsert_customers(lines, "ndjson", chunk_size=2)
+        self.assertEqual((result.created, result.updated, result.rejected), (3, 4, 1))
+        self.assertEqual(result.errors[0]["row"], 3)
+        self.assertEqual(Customer.objects.get(code="N0").name, "Name 6")
+
+    def test_list_version_bumped(self):
+        first = self.client.get(reverse("customer-list"))["ETag"]
+        self.client.post(self.url, '{"code": "C001", "name": "Changed"}\n', content_type="application/x-ndjson")
+        self.assertNotEqual(self.client.get(reverse("customer-list"))["ETag"], first)
+
+    def test_bad_input(self):
+        response = self.client.post(self.url, "code,label\nC9,x\n", content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, [{"code": "C9"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        response = self.client.post(self.url, "code,name\n,\n", content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["rejected"], 1)
+
+    def test_import_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "customers.csv.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as fh:
+                fh.write("\ufeffcode,name\nC001,From File\nC010,Another\n")
+            out = StringIO()
+            call_command("import_customers", path, "--chunk-size", "1", stdout=out, stderr=StringIO())
+        self.assertIn("Created 1, updated 1, rejected 0", out.getvalue())
+        self.assertEqual(Customer.objects.get(code="C001").name, "From File")
+        with self.assertRaises(CommandError):
+            call_command("import_customers", "customers.txt")
+
+
+class ChangeFeedTests(BaseAPITestCase):
+    url = "/api/changes/"
+
+    def feed(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def test_feed_reports_inserts_updates_and_deletes_in_order(self):
+        start = self.feed(limit=0)["next"]
+        order = Order.objects.create(customer=self.customer, item="Laptop", amount=Decimal("999.50"))
+        order.item = "Laptop Pro"
+        order.save()
+        self.customer.name = "Renamed"
+        self.customer.save()
+        order_id = order.pk
+        order.delete()
+
+        data = self.feed(after=start)
+        self.assertFalse(data["has_more"])
+        self.assertEqual(
+            [(c["table"], c["op"], c["id"]) for c in data["changes"]],
+            [("order", "insert", order_id), ("order", "update", order_id),
+             ("customer", "update", self.customer.pk), ("order", "delete", order_id)],
+        )
+        self.assertEqual(data["changes"][1]["data"]["item"], "Laptop Pro")
+        self.assertEqual(data["changes"][0]["data"]["amount"], "999.50")
+        self.assertIsNone(data["changes"][3]["data"])
+        self.assertEqual(data["next"], data["changes"][-1]["seq"])
+        self.assertEqual([c["seq"] for c in data["changes"]], list(range(start + 1, start + 5)))
+        self.assertEqual(self.feed(after=data["next"])["changes"], [])
+
+    def test_string_amount_is_logged_as_decimal(self):
+        start = self.feed(limit=0)["next"]
+        with patch("core.rollups.record_orders"):
+            Order.objects.create(customer=self.customer, item="Typed", amount="12.5")
+        self.assertEqual(self.feed(after=start)["changes"][0]["data"]["amount"], "12.50")
+
+    def test_batches_and_bulk_paths(self):
+        start = self.feed(limit=0)["next"]
+        self.client.post(reverse("order-bulk"), [{"customer": self.customer.pk, "item": str(i), "amount": 1} for i in range(3)], format="json")
+        upsert_customers(["code,name", "C001,Bulk Renamed", "C777,Bulk New"], "csv")
+        first = self.feed(after=start, limit=4)
+        self.assertTrue(first["has_more"])
+        rest = self.feed(after=first["next"], limit=4)
+        self.assertFalse(rest["has_more"])
+        ops = [(c["table"], c["op"]) for c in first["changes"] + rest["changes"]]
+        self.assertEqual(ops, [("order", "insert")] * 3 + [("customer", "update"), ("customer", "insert")])
+        self.assertEqual(rest["changes"][-1]["data"]["code"], "C777")
+
+    def test_sequence_follows_commit_order(self):
+        # A transaction that took id N but commits after N+1 was already read
+        reserved = ChangeLogEntry.objects.create(table="order", object_id=1, op="insert").pk
+        ChangeLogEntry.objects.filter(pk=reserved).delete()
+        ChangeLogEntry.objects.create(table="order", object_id=2, op="insert")
+        seen = self.feed()["next"]
+        ChangeLogEntry.objects.create(id=reserved, table="order", object_id=1, op="insert")
+        self.assertEqual([c["id"] for c in self.feed(after=seen)["changes"]], [1])
+
+    def test_rolled_back_writes_are_not_logged(self):
+        start = self.feed(limit=0)["next"]
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Order.objects.create(customer=self.customer, item="X", amount=1)
+                raise RuntimeError
+        self.assertEqual(self.feed(after=start)["changes"], [])
+
+    def test_long_poll_returns_when_a_change_arrives(self):
+        start = self.feed(limit=0)["next"]
+        with self.settings(CHANGES_POLL_INTERVAL=0.01):
+            with patch("core.changes.time.sleep", side_effect=lambda s: Order.objects.create(customer=self.customer, item="Late", amount=1)):
+                data = self.feed(after=start, wait=5)
+        self.assertEqual(data["changes"][0]["data"]["item"], "Late")
+
+    def test_purged_position_is_gone(self):
+        for i in range(3):
+            Order.objects.create(customer=self.customer, item=str(i), amount=1)
+        seqs = [c["seq"] for c in self.feed()["changes"]]
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(days=30))
+        Order.objects.create(customer=self.customer, item="kept", amount=1)
+        out = StringIO()
+        call_command("purge_changes", "--days", "7", stdout=out)
+        # The newest sequenced entry stays as the high-water mark
+        self.assertIn(f"Deleted {len(seqs) - 1} change log row(s).", out.getvalue())
+        self.assertEqual(self.client.get(self.url, {"after": seqs[0]}).status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.feed(after=seqs[-1])["changes"][0]["data"]["item"], "kept")
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {"after": "x", "limit": 999999, "wait": -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {"after", "limit", "wait"})
+
+
+class OrderExportTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [
+            Order.objects.create(customer=self.customer, item=f"Item {i}", amount=Decimal("10.5") * i)
+            for i in range(3)
+        ]
+
+    def test_export_ndjson_streams_all_orders(self):
+        response = self.client.get(reverse("order-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([r["id"] for r in rows], [o.id for o in self.orders])
+        self.assertEqual(rows[1]["amount"], "10.50")
+        self.assertEqual(rows[1]["customer"], self.customer.id)
+
+    def test_export_csv_with_since(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(time=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(reverse("order-export"), {"format": "csv", "since": since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,customer,item,amount,time")
+        self.assertEqual(len(lines), 3)
+
+    def test_export_rejects_bad_since(self):
+        response = self.client.get(reverse("order-export"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_orders_command_writes_gzip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "orders.ndjson.gz")
+            call_command("export_orders", "--output", path, stderr=StringIO())
+            with gzip.open(path, "rt") as fh:
+                self.assertEqual(len(fh.readlines()), 3)
+
+
+class ResponseFormatTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [
+            Order.objects.create(customer=self.customer, item=f"Item {i}", amount=Decimal("10.5") * i)
+            for i in range(3)
+        ]
+
+    def test_fast_json_matches_drf_json(self):
+        from rest_framework.renderers import JSONRenderer
+
+        response = self.client.get(reverse("order-list"))
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        payload = {"note": "line\u2028break", "amount": Decimal("1.50"), "time": timezone.now()}
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_malformed_json_is_a_400(self):
+        response = self.client.post(reverse("order-list"), "{", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        response = self.client.get(reverse("order-list"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data["results"], json.loads(json.dumps(response.data["results"])))
+
+        body = msgpack.packb({"customer": self.customer.pk, "item": "Packed", "amount": "12.50"})
+        with patch.object(utils, "sms", None):
+            response = self.client.post(
+                reverse("order-list"), body, content_type="application/msgpack", HTTP_ACCEPT="application/msgpack"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(msgpack.unpackb(response.content)["amount"], "12.50")
+
+    @skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_list_is_typed_and_keeps_pagination(self):
+        import pyarrow
+        import pyarrow.ipc
+
+        accept = "application/vnd.apache.arrow.stream"
+        response = self.client.get(reverse("order-list"), {"page_size": 2}, HTTP_ACCEPT=accept)
+        self.assertEqual(response["Content-Type"], accept)
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column_names, ["id", "customer", "item", "amount", "time"])
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.schema.field("amount").type, pyarrow.decimal128(10, 2))
+        self.assertTrue(pyarrow.types.is_timestamp(table.schema.field("time").type))
+        self.assertIn(b"cursor=", table.schema.metadata[b"next"])
+
+        response = self.client.get(reverse("customer-list"), HTTP_ACCEPT=accept)
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column("code").to_pylist(), ["C001"])
+
+    def test_encoding_benchmark(self):
+        results = bench_encoding.run(rows=50, repeat=1)
+        by_key = {(r["serializer"], r["format"]): r for r in results}
+        self.assertEqual(
+            by_key["order", "json"]["bytes_per_10k"], by_key["order", "orjson"]["bytes_per_10k"]
+        )
+        self.assertIn(("customer", "json"), by_key)
+
+
+REPLICA = "replica_test"
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA],
+    DATABASE_ROUTERS=["core.replicas.ReplicaRouter"],
+    MIDDLEWARE=[*settings.MIDDLEWARE, "core.replicas.ReplicaPinMiddleware"],
+)
+class ReplicaRoutingTests(BaseAPITestCase):
+    """A second SQLite database with the API tables stands in for a replica that has not caught up."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        stand_in = {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls.tmp.name, "replica.sqlite3")}
+        connections.settings[REPLICA] = connections.configure_settings(
+            {"default": connections.settings["default"], REPLICA: stand_in}
+        )[REPLICA]
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(Customer)
+            editor.create_model(Order)
+        # Declared only now: the test runner sets up the databases it finds before any class runs
+        cls.databases = {"default", REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.settings[REPLICA]
+        delattr(connections._connections, REPLICA)
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        super().setUp()
+        replicas.health.reset()
+        lag = patch.object(replicas, "replica_lag", return_value=0.0)
+        self.lag = lag.start()
+        self.addCleanup(lag.stop)
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections.settings[REPLICA]
+        delattr(connections._connections, REPLICA)
+
+    def test_reads_use_the_replica_until_the_client_writes(self):
+        Customer.objects.using(REPLICA).bulk_create([Customer(id=self.customer.pk, name="Replica copy", code="C001")])
+        response = self.client.get(reverse("customer-list"))
+        self.assertEqual([c["name"] for c in response.data["results"]], ["Replica copy"])
+        # The replica may lag the latest write, so the response is neither cached nor tagged
+        self.assertNotIn("ETag", response)
+        # Customer cache fills always read the primary
+        self.assertEqual(self.client.get(reverse("customer-detail", args=[self.customer.pk])).data["name"], "Test Customer")
+
+        with patch.object(utils, "sms", None):
+            response = self.client.post(
+                reverse("order-list"), {"customer": self.customer.pk, "item": "Fresh", "amount": "5.00"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        until = response[settings.REPLICA_PIN_HEADER]
+        detail = reverse("order-detail", args=[response.data["id"]])
+
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+        other = APIClient()
+        other.force_authenticate(self.user)
+        self.assertEqual(other.get(detail).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(other.get(detail, HTTP_X_PRIMARY_UNTIL=until).status_code, status.HTTP_200_OK)
+
+    def test_lagging_or_unreachable_replicas_are_dropped(self):
+        self.lag.return_value = 60.0
+        with self.assertLogs("core.replicas", "WARNING") as logs:
+            # Served by the primary, so cached and tagged as usual
+            response = self.client.get(reverse("order-list"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn("ETag", response)
+            self.assertIsNone(replicas.health.pick())
+
+            self.lag.side_effect = OperationalError("connection refused")
+            body = self.client.get(reverse("health")).data
+            self.assertEqual(body["status"], "ok")
+            self.assertEqual(body["replicas"][REPLICA], {"healthy": False, "lag": None})
+
+            self.lag.side_effect = None
+            self.lag.return_value = 1.0
+            self.assertEqual(replicas.health.refresh()[REPLICA], {"healthy": True, "lag": 1.0})
+            self.assertEqual(replicas.health.pick(), REPLICA)
+        self.assertEqual(
+            [r.getMessage().split(" (")[0] for r in logs.records],
+            ["Replica replica_test dropped", "Replica replica_test check failed", "Replica replica_test is back"],
+        )
+
+    def test_router_scope(self):
+        router = replicas.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Order))
+        with replicas.read_from_replica() as alias:
+            self.assertEqual(alias, REPLICA)
+            self.assertEqual(router.db_for_read(Order), REPLICA)
+            self.assertIsNone(router.db_for_read(User))
+            self.assertIsNone(router.db_for_read(ChangeLogEntry))
+        self.assertFalse(router.allow_migrate(REPLICA, "core"))
+        self.assertIsNone(router.allow_migrate("default", "core"))
+
+
+class CustomerStatsTests(BaseAPITestCase):
+    def assertRollupsMatchOrders(self):
+        expected = CustomerOrderDay.objects.order_by("customer", "day").values_list(
+            "customer", "day", "order_count", "total_amount", "last_order_time"
+        )
+        actual = list(expected)
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(actual, list(expected))
+
+    def test_rollups_follow_create_update_delete(self):
+        other = Customer.objects.create(name="Other", code="C002")
+        first = Order.objects.create(customer=self.customer, item="A", amount=Decimal("10.10"))
+        second = Order.objects.create(customer=self.customer, item="B", amount=Decimal("0.20"))
+        self.assertRollupsMatchOrders()
+
+        second.amount = Decimal("5.05")
+        second.save()
+        moved = Order.objects.get(pk=first.pk)
+        moved.customer = other
+        moved.save()
+        self.assertRollupsMatchOrders()
+
+        second.delete()
+        self.assertRollupsMatchOrders()
+        self.assertFalse(CustomerOrderDay.objects.filter(customer=self.customer).exists())
+
+        other.delete()
+        self.assertFalse(CustomerOrderDay.objects.exists())
+
+    def test_string_amount_is_rolled_up(self):
+        order = Order.objects.create(customer=self.customer, item="Typed", amount="12.50")
+        Order.objects.create(customer=self.customer, item="Float", amount=0.5)
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(CustomerOrderDay.objects.get(customer=self.customer).total_amount, Decimal("13.00"))
+        self.assertRollupsMatchOrders()
+
+    def test_stats_endpoints(self):
+        rows = [{"customer": self.customer.id, "item": f"I{i}", "amount": "0.10"} for i in range(3)]
+        self.client.post(reverse("order-bulk"), rows, format="json")
+        Order.objects.create(customer=self.customer, item="Single", amount=Decimal("0.20"))
+
+        response = self.client.get(reverse("customer-stats", args=[self.customer.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["order_count"], 4)
+        self.assertEqual(response.data["total_amount"], "0.50")
+        self.assertIsNotNone(response.data["last_order_time"])
+
+        response = self.client.get(reverse("customer-stats-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["customer"], self.customer.id)
+
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        response = self.client.get(reverse("customer-stats", args=[self.customer.id]), {"since": tomorrow})
+        self.assertEqual(response.data["order_count"], 0)
 
 
 class SMSAPITests(BaseAPITestCase):
@@ -83,6 +994,251 @@ class SMSAPITests(BaseAPITestCase):
         self.assertIn("status", response.json())
 
 
+@patch("core.utils.sms", None)
+class ThrottlingTests(BaseAPITestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/min"), (10, 60.0))
+        self.assertEqual(parse_rate("30/5m"), (30, 300.0))
+        self.assertEqual(parse_rate("3/hour"), (3, 3600.0))
+        with self.assertRaises(ValueError):
+            parse_rate("often")
+
+    def test_local_bucket_allows_burst_then_refills(self):
+        store = LocalBucketStore()
+        self.assertEqual([store.consume("k", 3, 60) for _ in range(3)], [0.0, 0.0, 0.0])
+        wait = store.consume("k", 3, 60)
+        self.assertAlmostEqual(wait, 20, delta=0.1)
+        self.assertEqual(store.consume("other", 3, 60), 0.0)
+        # A fast bucket refills within the test
+        self.assertEqual(store.consume("fast", 1, 0.05), 0.0)
+        self.assertGreater(store.consume("fast", 1, 0.05), 0)
+        time.sleep(0.06)
+        self.assertEqual(store.consume("fast", 1, 0.05), 0.0)
+
+    def test_cache_bucket_counts_across_stores(self):
+        # Two store instances stand in for two workers sharing the cache
+        first, second = CacheBucketStore(), CacheBucketStore()
+        self.assertEqual(first.consume("k", 2, 3600), 0.0)
+        self.assertEqual(second.consume("k", 2, 3600), 0.0)
+        self.assertGreater(first.consume("k", 2, 3600), 0)
+        self.assertGreater(second.consume("k", 2, 3600), 0)
+
+    def test_local_check_overhead_is_small(self):
+        store = LocalBucketStore()
+        started = time.perf_counter()
+        for i in range(10000):
+            store.consume(f"user:{i % 100}", 1000000, 60)
+        self.assertLess((time.perf_counter() - started) / 10000, 0.0001)
+
+    def test_test_sms_throttled_per_phone_with_retry_after(self):
+        url = reverse("test_sms")
+        with self.settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"test_sms_ip": "100/min", "test_sms_phone": "2/hour"},
+        }):
+            for _ in range(2):
+                self.assertEqual(self.client.get(url, {"phone": "+254700000001"}).status_code, status.HTTP_200_OK)
+            response = self.client.get(url, {"phone": "254700000001"})
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response["Retry-After"], "1800")
+            # Another destination has its own bucket
+            self.assertEqual(self.client.get(url, {"phone": "+254700000002"}).status_code, status.HTTP_200_OK)
+
+    def test_test_sms_throttled_per_ip(self):
+        url = reverse("test_sms")
+        for i in range(5):
+            self.client.get(url, {"phone": f"+25470000001{i}"})
+        response = self.client.get(url, {"phone": "+254700000019"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+        other_ip = self.client.get(url, {"phone": "+254700000019"}, REMOTE_ADDR="10.0.0.9")
+        self.assertEqual(other_ip.status_code, status.HTTP_200_OK)
+
+    def test_order_create_throttled_per_phone(self):
+        url = reverse("order-list")
+        with self.settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"order_create_user": "100/min", "order_create_phone": "1/min"},
+        }):
+            data = {"customer": self.customer.id, "item": "Laptop", "amount": "1.00"}
+            self.assertEqual(self.client.post(url, data, format="json").status_code, status.HTTP_201_CREATED)
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(Order.objects.count(), 1)
+            # Reads are not throttled
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_order_bulk_throttled_per_user(self):
+        url = reverse("order-bulk")
+        with self.settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"order_create_user": "100/min", "order_bulk_user": "1/min"},
+        }):
+            rows = [{"customer": self.customer.id, "item": "Laptop", "amount": "1.00"}] * 2
+            self.assertEqual(self.client.post(url, rows, format="json").status_code, status.HTTP_201_CREATED)
+            response = self.client.post(url, rows, format="json")
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertIn("Retry-After", response)
+            self.assertEqual(Order.objects.count(), 2)
+
+    def test_throttling_can_be_disabled(self):
+        url = reverse("test_sms")
+        with self.settings(THROTTLE_ENABLED=False):
+            for _ in range(10):
+                self.assertEqual(self.client.get(url, {"phone": "+254700000001"}).status_code, status.HTTP_200_OK)
+
+
+class MetricsTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_registry.clear()
+
+    def test_request_metrics_per_view(self):
+        Order.objects.create(customer=self.customer, item="A", amount=1)
+        self.client.get(reverse("order-list"), {"expand": "customer"})
+        labels = (("view", "order-list"),)
+        self.assertEqual(metrics_registry.snapshot("savannah_request_duration_seconds", labels)[0], 1)
+        # Session + user + page query
+        self.assertEqual(metrics_registry.snapshot("savannah_request_queries", labels), (1, 3))
+        self.assertEqual(metrics_registry.snapshot("savannah_request_serializer_seconds", labels)[0], 1)
+        self.assertIsNone(metrics_registry.snapshot("savannah_request_sms_seconds", labels))
+
+    def test_sms_time_attributed_to_view(self):
+        with patch("core.utils.sms", None):
+            self.client.get(reverse("test_sms"), {"phone": "+254700000000"})
+        self.assertEqual(metrics_registry.snapshot("savannah_request_sms_seconds", (("view", "test_sms"),))[0], 1)
+
+    @override_settings(METRICS_TOKEN="", METRICS_PUBLIC=True)
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.get(reverse("customer-list"))
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE savannah_request_duration_seconds histogram", body)
+        self.assertIn('savannah_requests_total{view="customer-list",method="GET",status="200"} 1', body)
+        self.assertIn('savannah_request_duration_seconds_bucket{view="customer-list",le="+Inf"} 1', body)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_metrics_hidden_without_token(self):
+        with self.settings(METRICS_TOKEN="", METRICS_PUBLIC=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 404)
+
+    def test_timed_outside_requests_is_a_noop(self):
+        with timed("sms"):
+            pass
+        self.assertEqual(metrics_registry.render(), "\n")
+
+    def test_slow_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with self.settings(PROFILE_SLOW_REQUESTS_MS=1, PROFILE_SAMPLE_INTERVAL_MS=1, PROFILE_DIR=profile_dir):
+                with patch("core.views.send_sms", side_effect=lambda *a, **k: time.sleep(0.05) or {"status": "ok"}):
+                    self.client.get(reverse("test_sms"), {"phone": "+254700000000"})
+            [name] = os.listdir(profile_dir)
+            self.assertTrue(name.startswith("test_sms-"))
+            with open(os.path.join(profile_dir, name)) as fh:
+                stacks = fh.read()
+        self.assertIn("test_sms", stacks)
+        self.assertIn("<lambda>", stacks)
+
+    def test_fold_stack(self):
+        import sys
+        self.assertTrue(fold_stack(sys._getframe()).endswith("tests.py:test_fold_stack"))
+
+
+class HealthTests(APITestCase):
+    def test_health_reports_database(self):
+        response = self.client.get(reverse("health"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "ok")
+        self.assertIn("reused", response.data["database"])
+
+    def test_health_hides_database_errors(self):
+        error = OperationalError('connection to server at "db.internal" (10.0.0.5), user "savannah" failed')
+        with patch.object(connection, "cursor", side_effect=error), self.assertLogs("core.views", "ERROR"):
+            response = self.client.get(reverse("health"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data, {"status": "unavailable"})
+
+
+class BenchTests(APITestCase):
+    def test_scenarios_run_against_seeded_data(self):
+        user = User.objects.create_user("bench", password="pw")
+        customer_ids = bench_data.seed(customers=3, orders=20)
+        order_ids = list(Order.objects.values_list("id", flat=True))
+        self.assertEqual(len(order_ids), 20)
+        scenarios = default_scenarios(customer_ids, order_ids)
+        results = run_all(scenarios, make_clients(user, "pw"), iterations=2, only={"order_list", "order_create"})
+        by_name = {r["name"]: r for r in results}
+        self.assertEqual(by_name["order_list"]["statuses"], [200])
+        self.assertEqual(by_name["order_create"]["statuses"], [201])
+        self.assertEqual(by_name["order_list"]["queries"], 1)
+        self.assertGreater(by_name["order_list"]["p50_ms"], 0)
+
+    def test_compare_flags_query_and_latency_regressions(self):
+        base = {"x": {"name": "x", "queries": 2, "p50_ms": 10.0, "alloc_kib": 100.0}}
+        ok = [{"name": "x", "queries": 2, "p50_ms": 12.0, "alloc_kib": 90.0}]
+        self.assertEqual(bench_baseline.compare(ok, base, tolerance=0.5), [])
+        bad = [{"name": "x", "queries": 3, "p50_ms": 16.0, "alloc_kib": 90.0}]
+        self.assertEqual(len(bench_baseline.compare(bad, base, tolerance=0.5)), 2)
+
+    def test_importtime_parsing(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     rest_framework.compat\n"
+            "import time:       300 |        420 |   rest_framework\n"
+            "import time:        50 |         50 | core.phones\n"
+            "System check identified no issues (1 silenced).\n"
+        )
+        entries = bench_startup.parse_importtime(stderr)
+        self.assertEqual(entries[1], (300, 420, "rest_framework"))
+        self.assertEqual(bench_startup.package_totals(entries), {"rest_framework": 420, "core": 50})
+
+
+class SettingsProfileTests(APITestCase):
+    def loaded(self, profile):
+        code = (
+            "import django; django.setup(); from django.conf import settings; import json; "
+            "print(json.dumps([settings.INSTALLED_APPS, settings.MIDDLEWARE, list(settings.AUTHENTICATION_BACKENDS)]))"
+        )
+        env = {**os.environ, "SAVANNAH_PROFILE": profile, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        out = subprocess.run([sys.executable, "-c", code], env=env, cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout
+        return json.loads(out.splitlines()[-1])
+
+    def test_api_profile_drops_admin_and_social_auth(self):
+        apps, middleware, backends = self.loaded("api")
+        for app in ("django.contrib.admin", "social_django", "drf_yasg"):
+            self.assertNotIn(app, apps)
+        self.assertIn("django.contrib.sessions", apps)
+        self.assertNotIn("social_django.middleware.SocialAuthExceptionMiddleware", middleware)
+        self.assertEqual(backends, ["django.contrib.auth.backends.ModelBackend"])
+
+    def test_worker_profile_has_no_middleware(self):
+        apps, middleware, _ = self.loaded("worker")
+        self.assertNotIn("django.contrib.sessions", apps)
+        self.assertIn("core", apps)
+        self.assertEqual(middleware, [])
+
+    def test_replica_urls_add_databases_router_and_middleware(self):
+        code = (
+            "from savannah_api import settings as s; import json; "
+            "print(json.dumps([s.DATABASE_REPLICAS, s.DATABASES['replica_2'], s.DATABASE_ROUTERS, s.MIDDLEWARE[-1]]))"
+        )
+        env = {**os.environ,
+               "DB_REPLICA_URLS": "postgres://ro:pw@replica-a/savannah, postgres://ro:pw@replica-b:6432/savannah"}
+        out = subprocess.run([sys.executable, "-c", code], env=env, cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout
+        aliases, second, routers, last_middleware = json.loads(out.splitlines()[-1])
+        self.assertEqual(aliases, ["replica_1", "replica_2"])
+        self.assertEqual((second["HOST"], second["PORT"], second["TEST"]), ("replica-b", 6432, {"MIRROR": "default"}))
+        self.assertEqual(second["OPTIONS"]["connect_timeout"], settings.REPLICA_CONNECT_TIMEOUT)
+        self.assertEqual(routers, ["core.replicas.ReplicaRouter"])
+        self.assertEqual(last_middleware, "core.replicas.ReplicaPinMiddleware")
+
+
 class UtilsTestCase(APITestCase):
     @patch("core.utils.sms", None)
     def test_send_sms_returns_simulated_when_not_configured(self):
@@ -95,3 +1251,417 @@ class UtilsTestCase(APITestCase):
         mock_sms.send.return_value = {"status": "success"}
         response = send_sms("+254700000000", "Hello test")
         self.assertEqual(response, {"status": "success"})
+
+    @patch("core.utils.sms", utils._NOT_LOADED)
+    def test_sms_client_is_created_once_on_first_use(self):
+        with self.settings(AFRICASTALKING_USERNAME="sandbox", AFRICASTALKING_API_KEY="key"), \
+                patch("africastalking.initialize") as initialize, patch("africastalking.SMS", "sms-service"):
+            threads = [threading.Thread(target=get_sms_client) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(get_sms_client(), "sms-service")
+        initialize.assert_called_once_with("sandbox", "key")
+
+    @patch("core.utils.sms", utils._NOT_LOADED)
+    def test_sms_client_without_credentials(self):
+        with self.settings(AFRICASTALKING_USERNAME="", AFRICASTALKING_API_KEY=""):
+            self.assertIsNone(get_sms_client())
+        self.assertEqual(send_sms("+254700000000", "Hi")["status"], "simulated")
+
+
+def gateway_response(*numbers, failed=()):
+    """Africa's Talking style response for a bulk send."""
+    return {"SMSMessageData": {"Message": "Sent", "Recipients": [
+        {"number": n, "status": "InvalidPhoneNumber" if n in failed else "Success",
+         "statusCode": 403 if n in failed else 101, "messageId": f"ATXid_{i}", "cost": "KES 0.8000"}
+        for i, n in enumerate(numbers)
+    ]}}
+
+
+class PhoneNormalizationTests(APITestCase):
+    def test_normalize_phone(self):
+        for raw in ["+254700000000", "+254 700-000-000", "0700000000", "00254700000000", "254700000000", "(0700) 000 000"]:
+            self.assertEqual(normalize_phone(raw), "+254700000000", raw)
+        self.assertEqual(normalize_phone("0700000000", country_code="255"), "+255700000000")
+        for raw in [None, "", "12ab", "+0123456789", "+1234567890123456", "123"]:
+            self.assertIsNone(normalize_phone(raw), raw)
+
+    def test_customer_save_maintains_phone_e164(self):
+        customer = Customer.objects.create(name="A", code="P1", phone_number="0711 111 111")
+        self.assertEqual(Customer.objects.get(pk=customer.pk).phone_e164, "+254711111111")
+        customer.phone_number = "not a phone"
+        customer.save(update_fields=["phone_number"])
+        self.assertIsNone(Customer.objects.get(pk=customer.pk).phone_e164)
+
+    def test_backfill_command(self):
+        customers = [Customer.objects.create(name=str(i), code=f"P{i}", phone_number=f"07000000{i:02d}") for i in range(3)]
+        Customer.objects.update(phone_e164=None)
+        out = StringIO()
+        call_command("backfill_phone_e164", "--batch-size", "2", stdout=out)
+        self.assertIn("Scanned 3 customer(s), updated phone_e164 on 3.", out.getvalue())
+        self.assertEqual(Customer.objects.get(pk=customers[2].pk).phone_e164, "+254700000002")
+
+    @patch("core.utils.sms")
+    def test_broadcast_sends_once_per_phone(self, mock_sms):
+        Customer.objects.create(name="A", code="B1", phone_number="+254700000000")
+        Customer.objects.create(name="B", code="B2", phone_number="0700 000 000")
+        Customer.objects.create(name="C", code="B3", phone_number="254711111111")
+        Customer.objects.create(name="D", code="B4")
+        # One indexed DISTINCT read and one insert
+        with self.assertNumQueries(2):
+            self.assertEqual(enqueue_broadcast("Sale today", Customer.objects.all()), 2)
+        # The order confirmation path stores numbers in the same form, so a
+        # separately queued copy is sent in its own call
+        enqueue_sms("0711111111", "Sale today")
+        mock_sms.send.side_effect = [
+            gateway_response("+254700000000", "+254711111111"),
+            gateway_response("+254711111111"),
+        ]
+        self.assertEqual(dispatch_batch(), 3)
+        self.assertEqual([c.args for c in mock_sms.send.call_args_list], [
+            ("Sale today", ["+254700000000", "+254711111111"]),
+            ("Sale today", ["+254711111111"]),
+        ])
+        self.assertEqual(SMSNotification.objects.filter(status=SMSNotification.STATUS_SENT).count(), 3)
+
+
+class BulkSMSTests(APITestCase):
+    @patch("core.utils.sms")
+    def test_send_bulk_sms_reports_per_recipient_status(self, mock_sms):
+        mock_sms.send.return_value = gateway_response("+254700000000", "+254711111111", failed=["+254711111111"])
+        results = send_bulk_sms("Promo", ["254700000000", "+254711111111", "+254700000000"])
+        mock_sms.send.assert_called_once_with("Promo", ["+254700000000", "+254711111111"])
+        self.assertEqual([r["success"] for r in results], [True, False])
+        self.assertEqual(results[1]["status"], "InvalidPhoneNumber")
+
+    def test_batcher_groups_by_text_and_splits_at_max_size(self):
+        calls = []
+
+        def sender(message, numbers, fail_silently=True):
+            calls.append((message, list(numbers)))
+            return [{"number": n, "status": "Success", "success": True} for n in numbers]
+
+        batcher = SMSBatcher(max_batch_size=2, flush_interval=60, sender=sender)
+        for number in ["+1", "+2", "+3"]:
+            batcher.add(number, "Promo")
+        batcher.add_template("+4", "Hi {name}", name="Ann")
+        self.assertEqual(calls, [("Promo", ["+1", "+2"])])
+        results = batcher.flush()
+        self.assertEqual(calls[1:], [("Promo", ["+3"]), ("Hi Ann", ["+4"])])
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[-1]["message"], "Hi Ann")
+
+    def test_batcher_flushes_after_interval(self):
+        sender = lambda message, numbers, fail_silently=True: [
+            {"number": n, "status": "Success", "success": True} for n in numbers
+        ]
+        batcher = SMSBatcher(max_batch_size=100, flush_interval=0, sender=sender)
+        batcher.add("+1", "Promo")
+        self.assertEqual(len(batcher.results), 1)
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.notification = SMSNotification.objects.create(to_number="+254700000000", message="Hello outbox")
+
+    @patch("core.utils.sms")
+    def test_dispatch_command_sends_pending(self, mock_sms):
+        mock_sms.send.return_value = gateway_response("+254700000000")
+        call_command("dispatch_sms", "--once", stdout=StringIO())
+        mock_sms.send.assert_called_once_with("Hello outbox", ["+254700000000"])
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, SMSNotification.STATUS_SENT)
+        self.assertEqual(self.notification.attempts, 1)
+        self.assertIsNotNone(self.notification.sent_at)
+
+    @patch("core.utils.sms")
+    def test_dispatch_coalesces_identical_messages(self, mock_sms):
+        SMSNotification.objects.create(to_number="254711111111", message="Hello outbox")
+        mock_sms.send.return_value = gateway_response("+254700000000", "+254711111111")
+        self.assertEqual(dispatch_batch(), 2)
+        mock_sms.send.assert_called_once_with("Hello outbox", ["+254700000000", "+254711111111"])
+        self.assertEqual(SMSNotification.objects.filter(status=SMSNotification.STATUS_SENT).count(), 2)
+
+    @patch("core.utils.sms")
+    def test_dispatch_sends_repeated_number_and_text_separately(self, mock_sms):
+        # e.g. the same order placed twice: each row gets its own SMS
+        duplicate = SMSNotification.objects.create(to_number="0700000000", message="Hello outbox")
+        mock_sms.send.side_effect = [gateway_response("+254700000000"), {}]
+        self.assertEqual(dispatch_batch(), 2)
+        self.assertEqual(mock_sms.send.call_count, 2)
+        mock_sms.send.assert_called_with("Hello outbox", ["+254700000000"])
+        self.notification.refresh_from_db()
+        duplicate.refresh_from_db()
+        self.assertEqual(self.notification.status, SMSNotification.STATUS_SENT)
+        # The second call reported nothing, so only that row is retried
+        self.assertEqual(duplicate.status, SMSNotification.STATUS_PENDING)
+        self.assertEqual(duplicate.last_error, "missing")
+
+    @patch("core.utils.sms")
+    def test_dispatch_failure_schedules_retry(self, mock_sms):
+        mock_sms.send.side_effect = RuntimeError("gateway down")
+        self.assertEqual(dispatch_batch(), 1)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, SMSNotification.STATUS_PENDING)
+        self.assertEqual(self.notification.attempts, 1)
+        self.assertEqual(self.notification.last_error, "gateway down")
+        self.assertGreater(self.notification.next_attempt_at, timezone.now())
+        # Not due yet, so the next pass skips it
+        self.assertEqual(dispatch_batch(), 0)
+
+    @patch("core.utils.sms")
+    def test_dispatch_gives_up_after_max_attempts(self, mock_sms):
+        mock_sms.send.side_effect = RuntimeError("gateway down")
+        with self.settings(SMS_OUTBOX_MAX_ATTEMPTS=1):
+            dispatch_batch()
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, SMSNotification.STATUS_FAILED)
+
+
+class FakeGateway:
+    """
+    Local stand-in for the Africa's Talking messaging API. Records each call
+    and the peak number of calls in flight; ``fail`` makes it answer 500.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fail = False
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+                with gateway.lock:
+                    gateway.calls.append({"api_key": self.headers.get("apiKey"), **{k: v[0] for k, v in body.items()}})
+                    gateway.in_flight += 1
+                    gateway.max_in_flight = max(gateway.max_in_flight, gateway.in_flight)
+                time.sleep(gateway.delay)
+                with gateway.lock:
+                    gateway.in_flight -= 1
+                if gateway.fail:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                payload = json.dumps(gateway_response(*body["to"][0].split(","))).encode()
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/version1/messaging"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AsyncSMSTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.gateway = FakeGateway(delay=0.05)
+        self.gateway.__enter__()
+        self.addCleanup(self.gateway.__exit__)
+        gateway_settings = self.settings(
+            AFRICASTALKING_USERNAME="sandbox", AFRICASTALKING_API_KEY="key", SMS_GATEWAY_URL=self.gateway.url,
+        )
+        gateway_settings.enable()
+        self.addCleanup(gateway_settings.disable)
+
+    def run_async(self, coroutine_function, *args, **kwargs):
+        async def run():
+            try:
+                return await coroutine_function(*args, **kwargs)
+            finally:
+                await aclose()
+        return async_to_sync(run)()
+
+    def test_bulk_send_posts_to_gateway(self):
+        results = self.run_async(asend_bulk_sms, "Promo", ["254700000000", "+254711111111"])
+        self.assertEqual([r["success"] for r in results], [True, True])
+        self.assertEqual(self.gateway.calls, [
+            {"api_key": "key", "username": "sandbox", "to": "+254700000000,+254711111111", "message": "Promo"},
+        ])
+
+    def test_many_sends_run_concurrently_within_limit(self):
+        messages = [(f"+2547000000{i:02d}", f"Hi {i}") for i in range(20)]
+        with self.settings(SMS_ASYNC_MAX_CONCURRENCY=5):
+            started = time.monotonic()
+            results = self.run_async(asend_many, messages)
+            elapsed = time.monotonic() - started
+        self.assertEqual(len(self.gateway.calls), 20)
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(self.gateway.max_in_flight, 5)
+        # 20 calls of 50ms each, five at a time
+        self.assertLess(elapsed, 20 * self.gateway.delay)
+
+    def test_gateway_error_becomes_error_results(self):
+        self.gateway.fail = True
+        results = self.run_async(asend_many, [("+254700000000", "Promo")])
+        self.assertEqual(results[0]["status"], "error")
+        self.assertFalse(results[0]["success"])
+
+    def test_async_dispatch_marks_rows_sent(self):
+        SMSNotification.objects.create(to_number="+254700000000", message="One")
+        SMSNotification.objects.create(to_number="+254711111111", message="Two")
+        self.assertEqual(self.run_async(adispatch_batch), 2)
+        self.assertEqual(SMSNotification.objects.filter(status=SMSNotification.STATUS_SENT).count(), 2)
+        self.assertEqual(len(self.gateway.calls), 2)
+
+    def test_async_dispatch_sends_repeated_number_and_text_separately(self):
+        SMSNotification.objects.create(to_number="+254700000000", message="One")
+        SMSNotification.objects.create(to_number="+254700000000", message="One")
+        self.assertEqual(self.run_async(adispatch_batch), 2)
+        self.assertEqual(len(self.gateway.calls), 2)
+        self.assertEqual(SMSNotification.objects.filter(status=SMSNotification.STATUS_SENT).count(), 2)
+
+    def test_async_dispatch_failure_schedules_retry(self):
+        self.gateway.fail = True
+        notification = SMSNotification.objects.create(to_number="+254700000000", message="One")
+        self.run_async(adispatch_batch)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, SMSNotification.STATUS_PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+    def test_async_order_create_sends_sms_immediately(self):
+        response = self.client.post(
+            reverse("order-create-async"),
+            {"customer": self.customer.id, "item": "Laptop", "amount": "1500.00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["item"], "Laptop")
+        notification = SMSNotification.objects.get(order_id=response.json()["id"])
+        self.assertEqual(notification.status, SMSNotification.STATUS_SENT)
+        self.assertEqual(self.gateway.calls[0]["to"], self.customer.phone_number)
+
+    def test_async_view_closes_its_client_outside_asgi(self):
+        clients = []
+        real_get_client = async_sms.get_client
+
+        def tracked():
+            client = real_get_client()
+            clients.append(client)
+            return client
+
+        with patch.object(async_sms, "get_client", side_effect=tracked):
+            # The test client is WSGI-style: a new event loop for this request
+            response = self.client.get(reverse("test_sms_async"), {"phone": "+254700000000"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(clients), 1)
+        self.assertTrue(clients[0].is_closed)
+
+    async def test_async_view_keeps_its_client_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        try:
+            response = await self.async_client.get(reverse("test_sms_async"), {"phone": "+254700000000"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(async_sms.get_client().is_closed)
+            self.assertEqual(len(self.gateway.calls), 1)
+        finally:
+            await aclose()
+
+    def test_async_order_create_validates_and_authenticates(self):
+        response = self.client.post(reverse("order-create-async"), {"item": "Laptop"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("customer", response.json())
+
+        self.client.logout()
+        response = self.client.post(
+            reverse("order-create-async"),
+            {"customer": self.customer.id, "item": "Laptop", "amount": "1"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Order.objects.exists())
+
+    def test_async_test_sms_endpoint(self):
+        response = self.client.get(reverse("test_sms_async"), {"phone": "254700000000"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.gateway.calls[0]["to"], "+254700000000")
+        self.assertEqual(self.client.get(reverse("test_sms_async")).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FakeCertsResponse:
+    status = 200
+    headers = {"Cache-Control": "public, max-age=3600, must-revalidate"}
+    data = b'{"kid": "cert"}'
+
+
+class FakeCertsEndpoint:
+    """Stands in for Google's certs endpoint and counts fetches."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        self.calls += 1
+        return FakeCertsResponse()
+
+
+class GoogleOIDCAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        certs_request.clear()
+        self.endpoint = FakeCertsEndpoint()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_certs_cached_for_max_age(self):
+        request = CachingCertsRequest(self.endpoint)
+        first = request("https://certs.example/")
+        second = request("https://certs.example/")
+        self.assertIs(first, second)
+        self.assertEqual(self.endpoint.calls, 1)
+
+    def test_repeat_token_skips_verification_and_database(self):
+        caching_request = CachingCertsRequest(self.endpoint)
+        idinfo = {"email": "oidc@example.com", "given_name": "O", "exp": time.time() + 3600}
+
+        def verify(token, request, audience):
+            request("https://certs.example/")
+            return idinfo
+
+        django_request = APIRequestFactory().get("/", HTTP_AUTHORIZATION="Bearer abc.def.ghi")
+        auth = GoogleOIDCAuthentication()
+        with self.settings(GOOGLE_OIDC_CLIENT_ID="client"), \
+                patch("core.authentication.certs_request", caching_request), \
+                patch("core.authentication.id_token.verify_oauth2_token", side_effect=verify) as mock_verify:
+            user, _ = auth.authenticate(django_request)
+            # Only the user is loaded: no verification, no get_or_create
+            with self.assertNumQueries(1):
+                cached_user, _ = auth.authenticate(django_request)
+            self.assertIsNot(cached_user, user)
+
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            with self.assertRaises(AuthenticationFailed):
+                auth.authenticate(django_request)
+            self.assertIsNone(token_cache.get("abc.def.ghi"))
+
+        self.assertEqual(cached_user, user)
+        self.assertEqual(user.username, "oidc@example.com")
+        mock_verify.assert_called_once()
+        self.assertEqual(self.endpoint.calls, 1)
+
+    def test_expired_token_is_verified_again(self):
+        user = User.objects.create_user(username="old@example.com")
+        token_cache.set("expired", time.time() - 1, user.pk)
+        self.assertIsNone(token_cache.get("expired"))
@@ -1,7 +1,7 @@
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase, APIClient
-from core.models import Customer
+from core.models import Customer, SMSNotification
 from unittest.mock import patch
 
 class ViewsTestCase(APITestCase):
@@ -19,13 +19,14 @@ class ViewsTestCase(APITestCase):
         self.assertEqual(Customer.objects.count(), 1)
         self.assertEqual(Customer.objects.first().name, 'Bob')
 
-    @patch('core.views.send_sms')
-    def test_create_order_triggers_sms(self, mock_send_sms):
+    @patch('core.utils.sms')
+    def test_create_order_queues_sms(self, mock_sms):
         # create customer
         cust = Customer.objects.create(name='SMS Test', code='S001', phone_number='+254703804272')
         url = reverse('order-list')
         data = {'customer': cust.id, 'item': 'Apple', 'amount': '50.00'}
         resp = self.client.post(url, data, format='json')
         self.assertEqual(resp.status_code, 201)
-        # ensure SMS was called
-        mock_send_sms.assert_called_once()
+        # ensure SMS was queued, not sent inline
+        mock_sms.send.assert_not_called()
+        self.assertEqual(SMSNotification.objects.filter(to_number=cust.phone_number).count(), 1)
@@ -0,0 +1,233 @@
+"""
+Token-bucket throttles for endpoints that cost money or capacity.
+
+Rates use DRF's ``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`` keyed by each
+throttle's ``scope``; ``"5/min"`` is a bucket of 5 tokens refilled at 5 per
+minute, and ``"30/5m"`` is 30 per five minutes. A scope without a rate is
+not throttled. Denied requests get ``429`` with ``Retry-After``.
+
+Buckets live in one of two stores, picked by ``THROTTLE_BACKEND``:
+
+``local``
+    An in-process, lock-protected LRU of buckets (``THROTTLE_LOCAL_MAX_KEYS``).
+    Each worker process enforces the rate on its own.
+``cache``
+    The Django cache named by ``THROTTLE_CACHE_ALIAS``, shared by all workers.
+    Only atomic ``incr``/``add`` are available there, so the bucket is
+    approximated by a sliding window counter with the same rate and burst.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import customer_cache
+from .phones import to_e164
+
+RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\w*\s*$")
+PERIOD_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60.0)``: bucket capacity and the seconds to refill it."""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid throttle rate {rate!r}; expected e.g. '10/min' or '30/5m'.")
+    capacity, multiplier, unit = match.groups()
+    return int(capacity), float(int(multiplier or 1) * PERIOD_SECONDS[unit])
+
+
+class LocalBucketStore:
+    """In-process token buckets. ``consume`` returns 0 when allowed, else seconds to wait."""
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        now = time.monotonic()
+        per_second = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Forgetting a bucket refills it; only idle ones are evicted in practice
+            while len(self._buckets) > settings.THROTTLE_LOCAL_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Shared buckets on the Django cache: a sliding window of ``period`` seconds,
+    counting the current window plus the overlapping part of the previous one.
+    Costs one ``incr`` and one ``get`` per check.
+    """
+
+    @property
+    def backend(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def consume(self, key, capacity, period):
+        now = time.time()
+        window = int(now // period)
+        elapsed = now - window * period
+        current_key = f"throttle:{key}:{window}"
+        timeout = math.ceil(period * 2) + 1
+
+        backend = self.backend
+        try:
+            count = backend.incr(current_key)
+        except ValueError:
+            count = 1 if backend.add(current_key, 1, timeout) else backend.incr(current_key)
+        previous = backend.get(f"throttle:{key}:{window - 1}", 0)
+
+        weight = 1 - elapsed / period
+        if previous * weight + count <= capacity:
+            return 0.0
+
+        # Denied requests do not use up the window
+        backend.decr(current_key)
+        if count <= capacity and previous:
+            # Allowed once enough of the previous window has slid out
+            return max(period * (1 - (capacity - count) / previous) - elapsed, 0.001)
+        # Allowed once the current window has become the previous one
+        carried = count - 1
+        next_window = period * (1 - (capacity - 1) / carried) if carried > capacity - 1 else 0.0
+        return period - elapsed + next_window
+
+    def clear(self):
+        self.backend.clear()
+
+
+_stores = {"local": LocalBucketStore(), "cache": CacheBucketStore()}
+
+
+def get_store():
+    return _stores[settings.THROTTLE_BACKEND]
+
+
+def reset_throttles():
+    """Empty every bucket of the configured store (meant for tests)."""
+    get_store().clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class; subclasses set ``scope`` and implement ``get_key``."""
+
+    scope = None
+
+    def __init__(self):
+        self._wait = None
+
+    def get_key(self, request, view):
+        """Bucket identity for this request, or None to skip throttling it."""
+        raise NotImplementedError(".get_key() must be overridden")
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if not rate:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self._wait = get_store().consume(f"{self.scope}:{key}", capacity, period)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user; anonymous requests share their IP's."""
+
+    def get_key(self, request, view):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client address (``X-Forwarded-For`` aware via ``NUM_PROXIES``)."""
+
+    def get_key(self, request, view):
+        return f"ip:{self.get_ident(request)}"
+
+
+class PhoneTokenBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per destination phone number. The number comes from
+    ``view.get_throttle_phone(request)`` when the view defines it, otherwise
+    from the ``phone`` query parameter.
+    """
+
+    def get_key(self, request, view):
+        if hasattr(view, "get_throttle_phone"):
+            phone = view.get_throttle_phone(request)
+        else:
+            phone = getattr(request, "query_params", request.GET).get("phone")
+        if not phone:
+            return None
+        return f"phone:{to_e164(phone)}"
+
+
+class TestSMSIPThrottle(IPTokenBucketThrottle):
+    scope = "test_sms_ip"
+
+
+class TestSMSPhoneThrottle(PhoneTokenBucketThrottle):
+    scope = "test_sms_phone"
+
+
+class OrderCreateUserThrottle(UserTokenBucketThrottle):
+    scope = "order_create_user"
+
+
+class OrderCreatePhoneThrottle(PhoneTokenBucketThrottle):
+    scope = "order_create_phone"
+
+
+class OrderBulkUserThrottle(UserTokenBucketThrottle):
+    scope = "order_bulk_user"
+
+
+def customer_phone(customer_id):
+    """Phone number of a customer id taken from request data, via the customer cache."""
+    try:
+        customer = customer_cache.get(int(customer_id))
+    except (TypeError, ValueError):
+        return None
+    return customer.phone_number if customer is not None else None
+
+
+def check_throttles(request, throttles):
+    """
+    Apply throttles outside DRF's dispatch (plain Django views).
+    Returns None when allowed, else the ``Retry-After`` seconds.
+    """
+    waits = [t.wait() for t in throttles if not t.allow_request(request, None)]
+    if waits:
+        return math.ceil(max(waits))
+    return None
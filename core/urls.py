@@ -1,12 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomerViewSet, OrderViewSet, test_sms  # 👈 include test_sms
+from .views import CustomerViewSet, OrderViewSet, changes, health, order_create_async, test_sms, test_sms_async  # 👈 include test_sms
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet, basename='customer')
 router.register(r'orders', OrderViewSet, basename='order')
 
 urlpatterns = [
+    # Ahead of the router so "async" is not taken for an order id
+    path("orders/async/", order_create_async, name="order-create-async"),
     path('', include(router.urls)),
     path("test-sms/", test_sms, name="test_sms"),  # 👈 fixed to use test_sms
+    path("test-sms/async/", test_sms_async, name="test_sms_async"),
+    path("changes/", changes, name="changes"),
+    path("health/", health, name="health"),
 ]
@@ -1,42 +1,192 @@
-from decouple import config
+from collections import OrderedDict
+from django.conf import settings
 import logging
+import threading
+import time
+
+from .metrics import timed
+from .phones import to_e164
 
 logger = logging.getLogger(__name__)
 
-# Africa's Talking initialization
-try:
-    import africastalking
-    AT_USERNAME = config("AFRICASTALKING_USERNAME", default=None)
-    AT_API_KEY = config("AFRICASTALKING_API_KEY", default=None)
+# Africa's Talking client, created on first use by get_sms_client() so that
+# processes which never send an SMS do not import or initialize the SDK.
+# Tests patch ``sms`` directly (None simulates an unconfigured gateway).
+_NOT_LOADED = object()
+sms = _NOT_LOADED
+_sms_lock = threading.Lock()
+
 
-    if AT_USERNAME and AT_API_KEY:
-        africastalking.initialize(AT_USERNAME, AT_API_KEY)
-        sms = africastalking.SMS
-    else:
+def _init_sms():
+    username, api_key = settings.AFRICASTALKING_USERNAME, settings.AFRICASTALKING_API_KEY
+    if not (username and api_key):
         logger.warning("Africa's Talking credentials not set — returning None.")
-        sms = None
-except Exception as e:
-    logger.exception("Failed to initialize Africa's Talking: %s", e)
-    sms = None
+        return None
+    try:
+        import africastalking
+
+        africastalking.initialize(username, api_key)
+        return africastalking.SMS
+    except Exception as e:
+        logger.exception("Failed to initialize Africa's Talking: %s", e)
+        return None
+
+
+def get_sms_client():
+    """The shared Africa's Talking SMS service, or None when it is not configured."""
+    global sms
+    client = sms
+    if client is _NOT_LOADED:
+        with _sms_lock:
+            if sms is _NOT_LOADED:
+                sms = _init_sms()
+            client = sms
+    return client
+
+
+# Gateway statusCodes that mean the message was accepted for delivery
+AT_SUCCESS_CODES = {100, 101, 102}
 
 
-def send_sms(to_number: str, message: str):
+@timed("sms")
+def send_sms(to_number: str, message: str, fail_silently: bool = True):
     """
     Send an SMS using Africa's Talking.
-    Ensures number starts with '+'. Returns simulated response if client not configured.
+    Normalizes the number to E.164. Returns simulated response if client not configured.
+    With fail_silently=False gateway errors are raised instead of simulated.
     """
+    sms = get_sms_client()
     if not sms:
         logger.info(f"Simulating SMS send to {to_number}: {message}")
         return {"status": "simulated", "to": to_number, "message": message}
 
-    # Ensure + prefix
-    if not to_number.startswith("+"):
-        to_number = f"+{to_number}"
+    to_number = to_e164(to_number)
 
     try:
         response = sms.send(message, [to_number])
         logger.info("SMS sent: %s", response)
         return response
     except Exception as e:
+        if not fail_silently:
+            raise
         logger.warning("Failed to send SMS, returning simulated response. Error: %s", e)
         return {"status": "simulated", "to": to_number, "message": message}
+
+
+@timed("sms")
+def send_bulk_sms(message: str, recipients, fail_silently: bool = True):
+    """
+    Send one message to many numbers in a single gateway call. Numbers are
+    normalized first, so one phone written in several formats gets one message.
+    Returns a list of per-recipient results:
+    {"number", "status", "success", "message_id", "cost"}.
+    """
+    numbers = list(OrderedDict.fromkeys(to_e164(n) for n in recipients))
+    sms = get_sms_client()
+    if not sms:
+        logger.info("Simulating bulk SMS send to %s recipient(s): %s", len(numbers), message)
+        return [_recipient_result(n, "simulated", True) for n in numbers]
+
+    try:
+        response = sms.send(message, numbers)
+        logger.info("Bulk SMS sent to %s recipient(s)", len(numbers))
+    except Exception as e:
+        if not fail_silently:
+            raise
+        logger.warning("Failed to send bulk SMS, returning simulated response. Error: %s", e)
+        return [_recipient_result(n, "simulated", True) for n in numbers]
+
+    return recipient_results(numbers, response)
+
+
+def recipient_results(numbers, response):
+    """Map a gateway bulk-send response onto one result per requested number."""
+    reported = {
+        r.get("number"): r
+        for r in (response or {}).get("SMSMessageData", {}).get("Recipients", [])
+    }
+    results = []
+    for number in numbers:
+        r = reported.get(number)
+        if r is None:
+            results.append(_recipient_result(number, "missing", False))
+        else:
+            results.append(_recipient_result(
+                number,
+                r.get("status", ""),
+                r.get("statusCode") in AT_SUCCESS_CODES,
+                message_id=r.get("messageId"),
+                cost=r.get("cost"),
+            ))
+    return results
+
+
+def _recipient_result(number, status, success, message_id=None, cost=None):
+    return {"number": number, "status": status, "success": success, "message_id": message_id, "cost": cost}
+
+
+class SMSBatcher:
+    """
+    Coalesce queued messages into multi-recipient gateway calls.
+
+    Messages with identical text are grouped and sent together, at most
+    ``max_batch_size`` recipients per call. A group is flushed as soon as it
+    is full; everything is flushed when ``flush_interval`` seconds have passed
+    since the oldest queued message (checked on ``add``), or on ``flush()``.
+
+        with SMSBatcher() as batcher:
+            for customer in customers:
+                batcher.add_template(customer.phone_number, "Hi {name}, ...", name=customer.name)
+        batcher.results  # per-recipient delivery status
+    """
+
+    def __init__(self, max_batch_size=None, flush_interval=None, sender=send_bulk_sms):
+        self.max_batch_size = max_batch_size or settings.SMS_BATCH_MAX_SIZE
+        self.flush_interval = settings.SMS_BATCH_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.sender = sender
+        self.results = []
+        self._groups = OrderedDict()
+        self._oldest = None
+
+    def add(self, to_number: str, message: str):
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        group = self._groups.setdefault(message, [])
+        group.append(to_number)
+        if len(group) >= self.max_batch_size:
+            self._send(message, self._groups.pop(message))
+        if self._groups and time.monotonic() - self._oldest >= self.flush_interval:
+            self.flush()
+        elif not self._groups:
+            self._oldest = None
+
+    def add_template(self, to_number: str, template: str, **context):
+        """Queue a per-recipient message rendered with ``str.format``."""
+        self.add(to_number, template.format(**context))
+
+    def flush(self):
+        """Send everything queued and return the results collected so far."""
+        while self._groups:
+            message, numbers = self._groups.popitem(last=False)
+            self._send(message, numbers)
+        self._oldest = None
+        return self.results
+
+    def _send(self, message, numbers):
+        try:
+            results = self.sender(message, numbers, fail_silently=False)
+        except Exception as e:
+            logger.warning("Bulk SMS to %s recipient(s) failed: %s", len(numbers), e)
+            results = [
+                dict(_recipient_result(to_e164(n), "error", False), error=str(e))
+                for n in OrderedDict.fromkeys(numbers)
+            ]
+        for result in results:
+            result["message"] = message
+        self.results.extend(results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
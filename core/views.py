@@ -1,49 +1,310 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.decorators import api_view, permission_classes
-from .models import Customer, Order
-from .serializers import CustomerSerializer, OrderSerializer
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import MethodNotAllowed, UnsupportedMediaType, ValidationError
+from .async_sms import asend_sms, closes_loop_client
+from .bulk import create_orders
+from .changes import ChangesGone, assign_sequence, last_seq, wait_for_changes
+from .cache import cached_list, customer_cache
+from .customer_import import decode_lines, upsert_customers
+from .export import export_lines, parse_since
+from .filters import filter_orders
+from .idempotency import idempotent
+from .rollups import order_day
+from .models import Customer, CustomerOrderDay, Order
+from .outbox import asend_notifications, enqueue_sms, order_message
+from .pagination import CustomerCursorPagination, CustomerStatsCursorPagination, OrderCursorPagination
+from .parsers import FastJSONParser, NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .replicas import ReplicaReadsMixin, health as replica_health
+from .serializers import (
+    CustomerSerializer,
+    CustomerStatsSerializer,
+    CustomerValuesSerializer,
+    OrderExpandedSerializer,
+    OrderSerializer,
+    OrderValuesSerializer,
+)
+from .throttling import (
+    OrderBulkUserThrottle,
+    OrderCreatePhoneThrottle,
+    OrderCreateUserThrottle,
+    TestSMSIPThrottle,
+    TestSMSPhoneThrottle,
+    check_throttles,
+    customer_phone,
+)
 from .utils import send_sms
 
+logger = logging.getLogger(__name__)
+
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     Handles customer CRUD operations.
     """
     queryset = Customer.objects.all().order_by("id")
     serializer_class = CustomerSerializer
+    pagination_class = CustomerCursorPagination
     permission_classes = [IsAuthenticated]
+    replica_actions = ("list", "retrieve", "stats", "stats_list")
+
+    @cached_list("customer")
+    def list(self, request, *args, **kwargs):
+        queryset = CustomerValuesSerializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(CustomerValuesSerializer(page).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Served from the customer cache; conditional GETs get a 304 without serializing."""
+        try:
+            customer = customer_cache.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            customer = None
+        if customer is None:
+            raise Http404
+        self.check_object_permissions(request, customer)
 
+        etag = f'"{customer.pk}-{customer.updated_at.timestamp():.6f}"'
+        last_modified = customer.updated_at.timestamp()
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+        return Response(
+            self.get_serializer(customer).data,
+            headers={"ETag": etag, "Last-Modified": http_date(last_modified)},
+        )
+
+    def stats_queryset(self):
+        """Rollup totals per customer, optionally limited with ?since= / ?until= (dates)."""
+        days = CustomerOrderDay.objects.all()
+        for param, lookup in (("since", "day__gte"), ("until", "day__lte")):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    days = days.filter(**{lookup: order_day(parse_since(value))})
+                except ValueError as e:
+                    raise ValidationError({param: [str(e)]})
+        return days.values("customer").annotate(
+            order_count=Sum("order_count"),
+            total_amount=Sum("total_amount"),
+            last_order_time=Max("last_order_time"),
+        )
 
-class OrderViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """Order count, amount total and last order time for one customer."""
+        customer = self.get_object()
+        totals = self.stats_queryset().filter(customer=customer.pk).order_by("customer").first()
+        if totals is None:
+            totals = {"customer": customer.pk, "order_count": 0, "total_amount": 0, "last_order_time": None}
+        return Response(CustomerStatsSerializer(totals).data)
+
+    @action(detail=False, methods=["get"], url_path="stats", pagination_class=CustomerStatsCursorPagination)
+    @cached_list("order")
+    def stats_list(self, request):
+        """Per-customer order totals for every customer that has orders."""
+        page = self.paginate_queryset(self.stats_queryset())
+        return self.get_paginated_response(CustomerStatsSerializer(page, many=True).data)
+
+    @action(detail=False, methods=["post"], url_path="bulk-upsert")
+    def bulk_upsert(self, request):
+        """
+        Create or update customers by ``code`` from a CSV (``text/csv``) or
+        NDJSON (``application/x-ndjson``) body. The body is read as a stream
+        and written in chunks; see core.customer_import.
+        Returns 200 when every row was applied, 207 when some were rejected
+        and 400 when none were applied.
+        """
+        formats = {"text/csv": "csv", "application/x-ndjson": "ndjson"}
+        fmt = formats.get(request.content_type.split(";")[0].strip())
+        if fmt is None:
+            raise UnsupportedMediaType(request.content_type, detail="Send text/csv or application/x-ndjson.")
+
+        lines = decode_lines(request.stream or ())
+        try:
+            result = upsert_customers(lines, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValidationError({"detail": str(e)})
+
+        if not result.rejected:
+            code = status.HTTP_200_OK
+        elif result.created or result.updated:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+
+class OrderViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     Handles order CRUD operations with SMS notification on creation.
+    The SMS is queued in the outbox and sent by ``manage.py dispatch_sms``.
+    Reads accept ``?expand=customer`` to embed the customer; the list takes
+    the filters in core.filters (customer, time and amount ranges, item).
     """
-    queryset = Order.objects.all().order_by("-time")
+    queryset = Order.objects.all().order_by("-time", "-id")
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
     permission_classes = [IsAuthenticated]
+    # Column types for Accept: application/vnd.apache.arrow.stream (core.renderers.ArrowRenderer)
+    arrow_types = {
+        "amount": lambda pa: pa.decimal128(10, 2),
+        "time": lambda pa: pa.timestamp("us", tz="UTC"),
+    }
+
+    def expand_customer(self):
+        return self.request.query_params.get("expand") == "customer"
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = filter_orders(queryset, self.request.query_params)
+        if self.expand_customer():
+            queryset = queryset.select_related("customer")
+        return queryset
+
+    def get_serializer_class(self):
+        if self.expand_customer() and self.action in ("list", "retrieve"):
+            return OrderExpandedSerializer
+        return super().get_serializer_class()
+
+    def get_throttles(self):
+        if self.action == "create":
+            return [OrderCreateUserThrottle(), OrderCreatePhoneThrottle()]
+        if self.action == "bulk":
+            return [OrderBulkUserThrottle()]
+        return super().get_throttles()
+
+    def get_throttle_phone(self, request):
+        if isinstance(request.data, dict):
+            return customer_phone(request.data.get("customer"))
+        return None
+
+    @cached_list("order", "customer")
+    def list(self, request, *args, **kwargs):
+        if self.expand_customer():
+            return super().list(request, *args, **kwargs)
+        queryset = OrderValuesSerializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(OrderValuesSerializer(page).data)
+
+    # Set by create_for_async: the caller sends the SMS itself
+    claim_notification = False
+    notification = None
+
+    @idempotent("orders")
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
-
-        # After save - send SMS
-        customer = order.customer
-        if customer.phone_number:
-            message = (
-                f"Hi {customer.name}, we received your order for "
-                f"{order.item} worth {order.amount}."
-            )
-            send_sms(customer.phone_number, message)
-
+        self.notification = self.save_with_notification(serializer, claim=self.claim_notification)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def save_with_notification(self, serializer, claim=False):
+        """Save the order and queue its SMS in one transaction; returns the outbox row."""
+        try:
+            with transaction.atomic():
+                order = serializer.save()
+
+                # Queue the SMS with the order; the dispatcher sends it after commit
+                customer = order.customer
+                if customer.phone_number:
+                    return enqueue_sms(customer.phone_number, order_message(customer, order), order=order, claim=claim)
+        except IntegrityError:
+            # The cached customer may have been deleted by another process since validation
+            customer = serializer.validated_data["customer"]
+            if Customer.objects.filter(pk=customer.pk).exists():
+                raise
+            customer_cache.invalidate(customer)
+            field = serializer.fields["customer"]
+            raise ValidationError({"customer": [field.error_messages["does_not_exist"].format(pk_value=customer.pk)]})
+
+    @classmethod
+    def create_for_async(cls, request):
+        """
+        Run ``create`` for a plain Django request outside DRF's dispatch
+        (authentication, permissions and throttles included). Returns the
+        rendered response and the outbox row, leased to the caller.
+        """
+        self = cls(action_map={"post": "create"}, args=(), kwargs={}, claim_notification=True)
+        request = self.initialize_request(request)
+        self.request = request
+        self.headers = self.default_response_headers
+        self.format_kwarg = None
+        try:
+            if request.method != "POST":
+                raise MethodNotAllowed(request.method)
+            self.initial(request)
+            response = self.create(request)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        response = self.finalize_response(request, response)
+        # None for replays and failures: there is nothing new to send
+        return response.render(), self.notification
+
+    @action(detail=False, methods=["post"], parser_classes=[FastJSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many orders from a JSON array or an NDJSON stream.
+        Returns 201 when every row was created, 207 when some were rejected
+        and 400 when none were; ``results`` holds one entry per input row.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"detail": "Expected a JSON array or NDJSON stream of orders."})
+        if len(rows) > settings.ORDERS_BULK_MAX_ROWS:
+            raise ValidationError({"detail": f"At most {settings.ORDERS_BULK_MAX_ROWS} orders per request."})
+
+        results = create_orders(rows)
+        created = sum(1 for r in results if "id" in r)
+        failed = len(results) - created
+        if not failed:
+            code = status.HTTP_201_CREATED
+        elif created:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({"created": created, "failed": failed, "results": results}, status=code)
+
+    @action(detail=False, methods=["get"], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream all orders, oldest first, as NDJSON (default) or CSV.
+        Example: /api/orders/export/?format=csv&since=2025-01-01
+        """
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = parse_since(since)
+            except ValueError as e:
+                raise ValidationError({"since": [str(e)]})
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export_lines(renderer.format, since=since),
+            content_type=f"{renderer.media_type}; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{renderer.format}"'
+        return response
+
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@throttle_classes([TestSMSIPThrottle, TestSMSPhoneThrottle])
 def test_sms(request):
     """
     Simple endpoint to test Africa's Talking SMS integration.
@@ -63,3 +324,119 @@ def test_sms(request):
         return Response({"status": "SMS sent successfully", "phone": phone})
     else:
         return Response({"error": "SMS sending failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@closes_loop_client
+async def order_create_async(request):
+    """
+    Async ``POST /api/orders/`` for ASGI workers. The order and its outbox
+    row are written in a worker thread, then the SMS is sent right away on
+    the shared async gateway client instead of waiting for the dispatcher.
+    A failed send stays in the outbox and is retried by ``dispatch_sms``.
+    """
+    response, notification = await sync_to_async(OrderViewSet.create_for_async)(request)
+    if notification is not None:
+        await asend_notifications([notification])
+    return response
+
+
+@require_GET
+@closes_loop_client
+async def test_sms_async(request):
+    """
+    Async variant of ``test_sms`` using the async gateway client.
+    Example: /api/test-sms/async/?phone=+2547XXXXXXX
+    """
+    phone = request.GET.get("phone")
+    if not phone:
+        return JsonResponse({"error": "Please provide ?phone=NUMBER"}, status=status.HTTP_400_BAD_REQUEST)
+
+    retry_after = await sync_to_async(check_throttles)(request, [TestSMSIPThrottle(), TestSMSPhoneThrottle()])
+    if retry_after is not None:
+        response = JsonResponse(
+            {"detail": f"Request was throttled. Expected available in {retry_after} seconds."},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        response["Retry-After"] = str(retry_after)
+        return response
+
+    response = await asend_sms(phone, "Hello from Savannah_api test endpoint 🚀")
+    if response:
+        return JsonResponse({"status": "SMS sent successfully", "phone": phone})
+    return JsonResponse({"error": "SMS sending failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def changes(request):
+    """
+    Order and customer changes after a sequence number, oldest first.
+    Example: /api/changes/?after=1200&limit=500&wait=20
+    ``wait`` (seconds) long-polls until a change arrives. Follow ``next``;
+    ``has_more`` says whether another batch is ready right away. See core.changes.
+    """
+    params, errors = {}, {}
+    bounds = {
+        "after": (0, 0, None),
+        "limit": (settings.CHANGES_PAGE_SIZE, 0, settings.CHANGES_MAX_LIMIT),
+        "wait": (0, 0, settings.CHANGES_MAX_WAIT),
+    }
+    for name, (default, low, high) in bounds.items():
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            errors[name] = ["A valid integer is required."]
+            continue
+        if value < low or (high is not None and value > high):
+            errors[name] = [f"Must be between {low} and {high}." if high is not None else f"Must be at least {low}."]
+        params[name] = value
+    if errors:
+        raise ValidationError(errors)
+
+    after = params["after"]
+    if params["limit"] == 0:
+        # Bootstrap: where the feed is now, to follow after a full export
+        assign_sequence()
+        return Response({"changes": [], "next": max(after, last_seq()), "has_more": False})
+    try:
+        batch, has_more = wait_for_changes(after, params["limit"], params["wait"])
+    except ChangesGone:
+        return Response(
+            {"detail": "Changes after this sequence number were purged; re-sync from a full export."},
+            status=status.HTTP_410_GONE,
+        )
+    return Response({"changes": batch, "next": batch[-1]["seq"] if batch else after, "has_more": has_more})
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def health(request):
+    """
+    Liveness/readiness probe. Runs ``SELECT 1`` and reports whether the
+    database connection was reused from an earlier request (CONN_MAX_AGE)
+    and, when pooling is enabled, the pool statistics. With read replicas it
+    re-checks them and reports each one's lag and health.
+    """
+    reused = connection.connection is not None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception:
+        # The probe is public; driver messages can name hosts and users
+        logger.exception("Health check query failed")
+        return Response({"status": "unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    database = {
+        "vendor": connection.vendor,
+        "conn_max_age": connection.settings_dict.get("CONN_MAX_AGE"),
+        "reused": reused,
+    }
+    pool = getattr(connection, "pool", None)
+    if pool is not None:
+        database["pool"] = pool.get_stats()
+    body = {"status": "ok", "database": database}
+    if settings.DATABASE_REPLICAS:
+        # A failing replica only loses its reads, so it does not fail the probe
+        body["replicas"] = replica_health.refresh()
+    return Response(body)
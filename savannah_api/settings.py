@@ -4,8 +4,10 @@ Django settings for savannah_api project.
 Generated by 'django-admin startproject' using Django 5.2.6.
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -40,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so timings cover every other middleware
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -70,9 +74,45 @@ TEMPLATES = [
     },
 ]
 
+# Settings profile, to keep processes from loading what they never use:
+#   full    everything (default)
+#   api     REST API only: no admin, social auth, API docs or messages
+#   worker  management commands and background workers (dispatch_sms,
+#           import_customers, ...): like api, also without sessions or middleware
+# Run migrate with the full profile so every app's tables exist.
+SAVANNAH_PROFILE = config("SAVANNAH_PROFILE", default="full")
+if SAVANNAH_PROFILE not in ("full", "api", "worker"):
+    raise ImproperlyConfigured(f"SAVANNAH_PROFILE must be full, api or worker, not {SAVANNAH_PROFILE!r}.")
+
+if SAVANNAH_PROFILE != "full":
+    _FULL_ONLY_APPS = {
+        "django.contrib.admin",
+        "django.contrib.messages",
+        "django.contrib.staticfiles",
+        "social_django",
+        "drf_yasg",
+    }
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in _FULL_ONLY_APPS]
+    MIDDLEWARE = [
+        m for m in MIDDLEWARE
+        if m not in ("django.contrib.messages.middleware.MessageMiddleware",
+                     "social_django.middleware.SocialAuthExceptionMiddleware")
+    ]
+    TEMPLATES[0]["OPTIONS"]["context_processors"] = [
+        p for p in TEMPLATES[0]["OPTIONS"]["context_processors"]
+        if not p.startswith(("social_django.", "django.contrib.messages."))
+    ]
+if SAVANNAH_PROFILE == "worker":
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "django.contrib.sessions"]
+    MIDDLEWARE = []
+
 WSGI_APPLICATION = "savannah_api.wsgi.application"
 
-# Database: PostgreSQL using pg8000
+# Database: PostgreSQL using psycopg 3
+# Either keep connections open between requests (DB_CONN_MAX_AGE seconds) or,
+# with DB_POOL=True, share a psycopg_pool pool per process (needs CONN_MAX_AGE=0).
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -81,9 +121,72 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST", "localhost"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        "CONN_MAX_AGE": 0 if DB_POOL else config("DB_CONN_MAX_AGE", default=60, cast=int),
+        "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        "OPTIONS": {},
+    }
+}
+
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+        "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+        "timeout": config("DB_POOL_TIMEOUT", default=10, cast=int),
+    }
+
+# Read replicas: comma-separated database URLs, added as replica_1, replica_2, ...
+# API list/retrieve requests read from a healthy one (see core.replicas).
+DB_REPLICA_URLS = [url.strip() for url in config("DB_REPLICA_URLS", default="").split(",") if url.strip()]
+DATABASE_REPLICAS = []
+REPLICA_CONNECT_TIMEOUT = config("REPLICA_CONNECT_TIMEOUT", default=2, cast=int)
+if DB_REPLICA_URLS:
+    import dj_database_url
+
+    for number, url in enumerate(DB_REPLICA_URLS, start=1):
+        replica = dj_database_url.parse(
+            url,
+            conn_max_age=DATABASES["default"]["CONN_MAX_AGE"],
+            conn_health_checks=DATABASES["default"]["CONN_HEALTH_CHECKS"],
+        )
+        if replica["ENGINE"] == "django.db.backends.postgresql":
+            # Health checks connect inside requests; fail fast on a dead replica
+            replica.setdefault("OPTIONS", {}).setdefault("connect_timeout", REPLICA_CONNECT_TIMEOUT)
+        replica["TEST"] = {"MIRROR": "default"}
+        DATABASES[f"replica_{number}"] = replica
+        DATABASE_REPLICAS.append(f"replica_{number}")
+    DATABASE_ROUTERS = ["core.replicas.ReplicaRouter"]
+    if MIDDLEWARE:
+        MIDDLEWARE = [*MIDDLEWARE, "core.replicas.ReplicaPinMiddleware"]
+# Replicas further behind than this (seconds) get no reads; checked every REPLICA_CHECK_INTERVAL
+REPLICA_MAX_LAG = config("REPLICA_MAX_LAG", default=5.0, cast=float)
+REPLICA_CHECK_INTERVAL = config("REPLICA_CHECK_INTERVAL", default=5.0, cast=float)
+# After a write the client reads from the primary for this long (cookie and header)
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", default=15, cast=int)
+REPLICA_PIN_COOKIE = config("REPLICA_PIN_COOKIE", default="primary_until")
+REPLICA_PIN_HEADER = config("REPLICA_PIN_HEADER", default="X-Primary-Until")
+
+
+# Caches (core.cache uses CUSTOMER_CACHE_ALIAS)
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="savannah-api"),
     }
 }
 
+CUSTOMER_CACHE_ALIAS = config("CUSTOMER_CACHE_ALIAS", default="default")
+CUSTOMER_CACHE_TIMEOUT = config("CUSTOMER_CACHE_TIMEOUT", default=300, cast=int)
+CUSTOMER_CACHE_LOCAL_SIZE = config("CUSTOMER_CACHE_LOCAL_SIZE", default=1024, cast=int)
+CUSTOMER_CACHE_LOCAL_TTL = config("CUSTOMER_CACHE_LOCAL_TTL", default=5, cast=int)
+
+
+# List responses (core.cache.cached_list): ETags from per-table change counters,
+# full responses cached per URL for LIST_CACHE_TIMEOUT seconds (0 = ETags only)
+LIST_CACHE_ALIAS = config("LIST_CACHE_ALIAS", default="default")
+LIST_CACHE_TIMEOUT = config("LIST_CACHE_TIMEOUT", default=60, cast=int)
+# The counters must be shared by every process that writes; with a process-local
+# LIST_CACHE_ALIAS (the locmem default) both are off unless this is set (check core.W001)
+LIST_CACHE_ALLOW_LOCAL = config("LIST_CACHE_ALLOW_LOCAL", default=DEBUG, cast=bool)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -109,8 +212,27 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Response/request formats. JSON goes through orjson (API_FAST_JSON=False for
+# DRF's encoder; the bytes are the same). MessagePack and Arrow are chosen by
+# Accept / Content-Type and only offered when msgpack / pyarrow are installed.
+API_FAST_JSON = config("API_FAST_JSON", default=True, cast=bool)
+API_RENDERER_CLASSES = [
+    "core.renderers.FastJSONRenderer" if API_FAST_JSON else "rest_framework.renderers.JSONRenderer",
+    "rest_framework.renderers.BrowsableAPIRenderer",
+    *(("core.renderers.MessagePackRenderer",) if find_spec("msgpack") else ()),
+    *(("core.renderers.ArrowRenderer",) if find_spec("pyarrow") else ()),
+]
+API_PARSER_CLASSES = [
+    "core.parsers.FastJSONParser" if API_FAST_JSON else "rest_framework.parsers.JSONParser",
+    "rest_framework.parsers.FormParser",
+    "rest_framework.parsers.MultiPartParser",
+    *(("core.parsers.MessagePackParser",) if find_spec("msgpack") else ()),
+]
+
 # DRF setup
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": API_RENDERER_CLASSES,
+    "DEFAULT_PARSER_CLASSES": API_PARSER_CLASSES,
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
@@ -118,16 +240,38 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "PAGE_SIZE": config("API_PAGE_SIZE", default=100, cast=int),
+    # Token buckets used by core.throttling ("N/period", e.g. "30/5m")
+    "DEFAULT_THROTTLE_RATES": {
+        "test_sms_ip": config("THROTTLE_TEST_SMS_IP", default="5/min"),
+        "test_sms_phone": config("THROTTLE_TEST_SMS_PHONE", default="3/hour"),
+        "order_create_user": config("THROTTLE_ORDER_CREATE_USER", default="120/min"),
+        "order_create_phone": config("THROTTLE_ORDER_CREATE_PHONE", default="20/min"),
+        "order_bulk_user": config("THROTTLE_ORDER_BULK_USER", default="10/min"),
+    },
 }
 
+# Throttle bucket store: "local" (per process) or "cache" (THROTTLE_CACHE_ALIAS, shared)
+THROTTLE_ENABLED = config("THROTTLE_ENABLED", default=True, cast=bool)
+THROTTLE_BACKEND = config("THROTTLE_BACKEND", default="local")
+THROTTLE_CACHE_ALIAS = config("THROTTLE_CACHE_ALIAS", default="default")
+THROTTLE_LOCAL_MAX_KEYS = config("THROTTLE_LOCAL_MAX_KEYS", default=100000, cast=int)
+
+# Pagination classes are set per view; PAGE_SIZE is their shared default
+SILENCED_SYSTEM_CHECKS = ["rest_framework.W001"]
+
 # OAuth (Google OIDC via social-auth-app-django)
 SOCIAL_AUTH_GOOGLE_OAUTH2_KEY = config("GOOGLE_CLIENT_ID", default="")
 SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = config("GOOGLE_CLIENT_SECRET", default="")
 SOCIAL_AUTH_GOOGLE_OAUTH2_SCOPE = ["email", "profile"]
 SOCIAL_AUTH_GOOGLE_OAUTH2_EXTRA_DATA = ["first_name", "last_name"]
 
+# Google ID tokens accepted by core.authentication.GoogleOIDCAuthentication
+GOOGLE_OIDC_CLIENT_ID = config("GOOGLE_OIDC_CLIENT_ID", default="")
+GOOGLE_OIDC_TOKEN_CACHE_SIZE = config("GOOGLE_OIDC_TOKEN_CACHE_SIZE", default=10000, cast=int)
+
 AUTHENTICATION_BACKENDS = (
-    "social_core.backends.google.GoogleOAuth2",
+    *(("social_core.backends.google.GoogleOAuth2",) if SAVANNAH_PROFILE == "full" else ()),
     "django.contrib.auth.backends.ModelBackend",
 )
 
@@ -138,3 +282,88 @@ LOGIN_REDIRECT_URL = "/"
 # Africa's Talking Config
 AFRICASTALKING_USERNAME = config("AFRICASTALKING_USERNAME", default="")
 AFRICASTALKING_API_KEY = config("AFRICASTALKING_API_KEY", default="")
+
+# SMS outbox dispatcher (manage.py dispatch_sms)
+SMS_OUTBOX_BATCH_SIZE = config("SMS_OUTBOX_BATCH_SIZE", default=100, cast=int)
+SMS_OUTBOX_POLL_INTERVAL = config("SMS_OUTBOX_POLL_INTERVAL", default=2.0, cast=float)
+SMS_OUTBOX_MAX_ATTEMPTS = config("SMS_OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+SMS_OUTBOX_RETRY_BASE_SECONDS = config("SMS_OUTBOX_RETRY_BASE_SECONDS", default=30, cast=int)
+SMS_OUTBOX_RETRY_MAX_SECONDS = config("SMS_OUTBOX_RETRY_MAX_SECONDS", default=3600, cast=int)
+# How long a row claimed by an async sender is hidden from other dispatchers
+SMS_OUTBOX_LEASE_SECONDS = config("SMS_OUTBOX_LEASE_SECONDS", default=60, cast=int)
+
+# Bulk SMS batching (core.utils.SMSBatcher)
+SMS_BATCH_MAX_SIZE = config("SMS_BATCH_MAX_SIZE", default=100, cast=int)
+SMS_BATCH_FLUSH_INTERVAL = config("SMS_BATCH_FLUSH_INTERVAL", default=5.0, cast=float)
+
+# Async SMS gateway client (core.async_sms)
+SMS_GATEWAY_URL = config(
+    "SMS_GATEWAY_URL",
+    default="https://api.sandbox.africastalking.com/version1/messaging"
+    if AFRICASTALKING_USERNAME == "sandbox"
+    else "https://api.africastalking.com/version1/messaging",
+)
+SMS_ASYNC_MAX_CONNECTIONS = config("SMS_ASYNC_MAX_CONNECTIONS", default=100, cast=int)
+SMS_ASYNC_MAX_CONCURRENCY = config("SMS_ASYNC_MAX_CONCURRENCY", default=100, cast=int)
+SMS_ASYNC_TIMEOUT = config("SMS_ASYNC_TIMEOUT", default=10.0, cast=float)
+
+# Bulk order ingestion (POST /api/orders/bulk/)
+ORDERS_BULK_MAX_ROWS = config("ORDERS_BULK_MAX_ROWS", default=50000, cast=int)
+ORDERS_BULK_BATCH_SIZE = config("ORDERS_BULK_BATCH_SIZE", default=1000, cast=int)
+ORDERS_BULK_USE_COPY = config("ORDERS_BULK_USE_COPY", default=True, cast=bool)
+
+# Country code for national numbers (0700000000 -> +254700000000); see core.phones
+PHONE_DEFAULT_COUNTRY_CODE = config("PHONE_DEFAULT_COUNTRY_CODE", default="254")
+
+# Streaming customer upsert (POST /api/customers/bulk-upsert/, manage.py import_customers)
+CUSTOMERS_UPSERT_CHUNK_SIZE = config("CUSTOMERS_UPSERT_CHUNK_SIZE", default=1000, cast=int)
+# Rejected rows reported back in detail; the rest are only counted
+CUSTOMERS_UPSERT_MAX_ERRORS = config("CUSTOMERS_UPSERT_MAX_ERRORS", default=100, cast=int)
+
+# Monthly partitioning of core_order on PostgreSQL (core.partitions, manage.py manage_partitions)
+ORDERS_PARTITIONED = config("ORDERS_PARTITIONED", default=False, cast=bool)
+ORDERS_PARTITION_PREMAKE_MONTHS = config("ORDERS_PARTITION_PREMAKE_MONTHS", default=3, cast=int)
+# Whole months kept before the current one; older partitions are archived (0 keeps all)
+ORDERS_PARTITION_RETENTION_MONTHS = config("ORDERS_PARTITION_RETENTION_MONTHS", default=0, cast=int)
+ORDERS_PARTITION_ARCHIVE_DIR = config("ORDERS_PARTITION_ARCHIVE_DIR", default=str(BASE_DIR / "archive"))
+
+# Change feed (GET /api/changes/, core.changes; manage.py purge_changes applies the retention)
+CHANGES_PAGE_SIZE = config("CHANGES_PAGE_SIZE", default=500, cast=int)
+CHANGES_MAX_LIMIT = config("CHANGES_MAX_LIMIT", default=5000, cast=int)
+CHANGES_MAX_WAIT = config("CHANGES_MAX_WAIT", default=30, cast=int)
+CHANGES_POLL_INTERVAL = config("CHANGES_POLL_INTERVAL", default=0.5, cast=float)
+CHANGES_SEQUENCE_BATCH = config("CHANGES_SEQUENCE_BATCH", default=10000, cast=int)
+CHANGES_WRITE_BATCH_SIZE = config("CHANGES_WRITE_BATCH_SIZE", default=1000, cast=int)
+CHANGES_RETENTION_DAYS = config("CHANGES_RETENTION_DAYS", default=7, cast=int)
+
+# Idempotency-Key on POST /api/orders/ (manage.py purge_idempotency_keys removes expired keys)
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=86400, cast=int)
+# A key still "in progress" after this many seconds is assumed abandoned
+IDEMPOTENCY_LOCK_TIMEOUT = config("IDEMPOTENCY_LOCK_TIMEOUT", default=60, cast=int)
+
+# Order export (GET /api/orders/export/, manage.py export_orders)
+ORDERS_EXPORT_CHUNK_SIZE = config("ORDERS_EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Request metrics at /metrics (core.metrics), served to METRICS_TOKEN as a Bearer token.
+# Without a token the endpoint is a 404 unless METRICS_PUBLIC allows anyone to read it
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_PUBLIC = config("METRICS_PUBLIC", default=DEBUG, cast=bool)
+# Sampling profiler: dump folded stacks of sync requests slower than this (0 = off)
+PROFILE_SLOW_REQUESTS_MS = config("PROFILE_SLOW_REQUESTS_MS", default=0, cast=int)
+PROFILE_SAMPLE_INTERVAL_MS = config("PROFILE_SAMPLE_INTERVAL_MS", default=5, cast=int)
+PROFILE_DIR = config("PROFILE_DIR", default=str(BASE_DIR / "profiles"))
+
+# Error reporting and tracing
+SENTRY_DSN = config("SENTRY_DSN", default="")
+if SENTRY_DSN:
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+
+    sentry_sdk.init(
+        dsn=SENTRY_DSN,
+        integrations=[DjangoIntegration()],
+        environment=config("SENTRY_ENVIRONMENT", default="production"),
+        traces_sample_rate=config("SENTRY_TRACES_SAMPLE_RATE", default=0.0, cast=float),
+        send_default_pii=False,
+    )
@@ -15,10 +15,18 @@ Including another URLconf
 
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include   # <-- include must be imported
 
+from core.metrics import metrics_view
+
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("api/", include("core.urls")),  # now include will work
+    path("metrics", metrics_view, name="metrics"),
 ]
+
+# Left out by the api/worker settings profiles (SAVANNAH_PROFILE)
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path("admin/", admin.site.urls))